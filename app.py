@@ -5,10 +5,14 @@ from PIL import Image
 from utils.db import init_db
 
 from utils.quote_generator import get_daily_quote
+from utils.shap_explainer import start_background_warmup
 
 # Initialize DB on app start
 init_db()
 
+# Load and warm the emotion model in the background
+start_background_warmup()
+
 st.set_page_config(
     page_title="Mental Health Copilot",
     page_icon="assets/logo.png",
@@ -0,0 +1,53 @@
+# model/bundle.py
+"""
+Write the emotion model to a local directory for fast, offline cold starts.
+
+Usage:
+    python -m model.bundle model/bundle
+    EMOTION_MODEL_DIR=model/bundle streamlit run app.py
+"""
+import argparse
+import json
+import os
+
+MANIFEST = "bundle.json"
+
+
+def bundle_model(output_dir, model_name):
+    """Save tokenizer, config and safetensors weights for model_name into output_dir."""
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name)
+    revision = getattr(model.config, "_commit_hash", None) or "main"
+
+    tokenizer.save_pretrained(output_dir)
+    model.save_pretrained(output_dir, safe_serialization=True)
+    with open(os.path.join(output_dir, MANIFEST), "w") as f:
+        json.dump({"model_name": model_name, "revision": revision}, f, indent=2)
+    return output_dir
+
+
+def read_manifest(bundle_dir):
+    """Return the {"model_name", "revision"} the bundle was built from."""
+    with open(os.path.join(bundle_dir, MANIFEST)) as f:
+        return json.load(f)
+
+
+def main():
+    from model.emotion_classifier import MODEL_NAME
+
+    parser = argparse.ArgumentParser(description="Bundle the emotion model for offline loading.")
+    parser.add_argument("output_dir", help="Directory to write the bundle to")
+    parser.add_argument("--model", default=MODEL_NAME, help="Model name or path to bundle")
+    args = parser.parse_args()
+
+    bundle_model(args.output_dir, args.model)
+    manifest = read_manifest(args.output_dir)
+    print(f"✅ Bundled {manifest['model_name']}@{manifest['revision']} to {args.output_dir}")
+    print(f"Set EMOTION_MODEL_DIR={args.output_dir} to load it offline.")
+
+
+if __name__ == "__main__":
+    main()
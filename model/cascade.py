@@ -0,0 +1,235 @@
+# model/cascade.py
+"""
+Confidence-gated cascade: a cheap TF-IDF + logistic regression first stage
+answers confident texts, and only uncertain ones escalate to DistilBERT.
+
+The first stage is distilled offline from already-labelled journal_entries.
+
+Usage:
+    python -m model.cascade train
+    python -m model.cascade evaluate --thresholds 0.7 0.8 0.9 0.95
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+
+import numpy as np
+
+FIRST_STAGE_PATH = os.getenv("CASCADE_MODEL_PATH", os.path.join("model", "cascade", "first_stage.joblib"))
+
+# journal_entries ids held out at train time; evaluate only reports on these
+HOLDOUT_PATH = os.path.splitext(FIRST_STAGE_PATH)[0] + ".holdout.json"
+
+# model_version prefix stamped on entries answered by the first stage
+FIRST_STAGE_VERSION_PREFIX = "cascade-tfidf@"
+
+
+class FirstStage:
+    """TF-IDF + logistic regression emotion classifier."""
+
+    def __init__(self, pipeline, version=None):
+        self.pipeline = pipeline
+        self.labels = [str(label) for label in pipeline.classes_]
+        self.version = version or f"{FIRST_STAGE_VERSION_PREFIX}unsaved"
+
+    @classmethod
+    def train(cls, texts, labels):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.pipeline import make_pipeline
+
+        pipeline = make_pipeline(
+            TfidfVectorizer(lowercase=True, ngram_range=(1, 2), sublinear_tf=True),
+            LogisticRegression(max_iter=1000, C=4.0),
+        )
+        pipeline.fit(texts, labels)
+        return cls(pipeline)
+
+    @classmethod
+    def load(cls, path=FIRST_STAGE_PATH):
+        """Load a saved first stage; its version is derived from the saved file's content hash."""
+        import joblib
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:12]
+        return cls(joblib.load(path), f"{FIRST_STAGE_VERSION_PREFIX}{digest}")
+
+    def save(self, path=FIRST_STAGE_PATH):
+        import joblib
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        joblib.dump(self.pipeline, path)
+
+    def predict_proba(self, texts, labels):
+        """Probabilities as an N x len(labels) array in the given label order (unseen labels get 0)."""
+        probs = self.pipeline.predict_proba(texts)
+        columns = {label.lower(): i for i, label in enumerate(self.labels)}
+        out = np.zeros((len(texts), len(labels)), dtype=np.float32)
+        for j, label in enumerate(labels):
+            if label.lower() in columns:
+                out[:, j] = probs[:, columns[label.lower()]]
+        return out
+
+
+class Cascade:
+    """
+    Routes texts between the first stage and the full model by first-stage confidence,
+    keeping escalation and agreement counters for threshold tuning.
+    """
+
+    def __init__(self, first_stage, threshold=0.9, agreement_sample_rate=0.05):
+        self.first_stage = first_stage
+        self.threshold = threshold
+        self.agreement_sample_rate = agreement_sample_rate
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.total = 0
+        self.escalated = 0
+        self.checked = 0
+        self.agreed = 0
+
+    def split(self, texts, labels):
+        """
+        Return (first-stage probs, indices answered by the first stage, indices to escalate,
+        indices of first-stage answers sampled for an agreement check).
+        """
+        probs = self.first_stage.predict_proba(texts, labels)
+        confident = probs.max(axis=1) >= self.threshold
+        answered = [i for i in range(len(texts)) if confident[i]]
+        escalate = [i for i in range(len(texts)) if not confident[i]]
+        sampled = [i for i in answered if random.random() < self.agreement_sample_rate]
+        with self._lock:
+            self.total += len(texts)
+            self.escalated += len(escalate)
+        return probs, answered, escalate, sampled
+
+    def record_agreement(self, first_stage_top, full_model_top):
+        with self._lock:
+            self.checked += len(first_stage_top)
+            self.agreed += sum(a == b for a, b in zip(first_stage_top, full_model_top))
+
+    def stats(self):
+        return {
+            "threshold": self.threshold,
+            "total": self.total,
+            "escalation_rate": self.escalated / self.total if self.total else 0.0,
+            "agreement_checked": self.checked,
+            "agreement": self.agreed / self.checked if self.checked else None,
+        }
+
+
+def evaluate_thresholds(first_stage, full_probs, texts, labels, thresholds):
+    """
+    Escalation rate and first-stage/full-model top-1 agreement on non-escalated texts
+    for each candidate threshold. full_probs are the full model's probabilities for texts.
+    """
+    probs = first_stage.predict_proba(texts, labels)
+    confidence = probs.max(axis=1)
+    agree = probs.argmax(axis=1) == full_probs.argmax(axis=1)
+    report = []
+    for threshold in thresholds:
+        answered = confidence >= threshold
+        report.append({
+            "threshold": threshold,
+            "escalation_rate": float(1 - answered.mean()),
+            "agreement": float(agree[answered].mean()) if answered.any() else None,
+            "overall_agreement": float(np.where(answered, agree, True).mean()),
+        })
+    return report
+
+
+def _labelled_entries(limit=None, ids=None):
+    """
+    (ids, texts, labels) of entries labelled by the full model (first-stage answers are excluded so it
+    never trains on itself), optionally restricted to the given entry ids.
+    """
+    from utils.db import get_connection
+
+    conn = get_connection()
+    c = conn.cursor()
+    query = """
+        SELECT id, entry, emotion FROM journal_entries
+        WHERE entry IS NOT NULL AND emotion IS NOT NULL
+          AND (model_version IS NULL OR model_version NOT LIKE ?)
+        ORDER BY id DESC
+    """
+    if limit and ids is None:
+        query += f" LIMIT {int(limit)}"
+    c.execute(query, (FIRST_STAGE_VERSION_PREFIX + "%",))
+    rows = c.fetchall()
+    conn.close()
+    if ids is not None:
+        # Filtered here rather than with IN (...), which would hit SQLite's bound-parameter limit
+        ids = set(ids)
+        rows = [row for row in rows if row[0] in ids][:limit or None]
+    return [row[0] for row in rows], [row[1] for row in rows], [row[2].lower() for row in rows]
+
+
+def save_holdout(ids, path=HOLDOUT_PATH):
+    with open(path, "w") as f:
+        json.dump(sorted(ids), f)
+
+
+def load_holdout(path=HOLDOUT_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train or evaluate the cascade's first-stage classifier.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    train = sub.add_parser("train", help="Fit the first stage on labelled journal entries")
+    train.add_argument("--limit", type=int, default=None)
+    train.add_argument("--holdout", type=float, default=0.1, help="Fraction held out to report agreement")
+    evaluate = sub.add_parser("evaluate", help="Report escalation rate and agreement per threshold on the hold-out")
+    evaluate.add_argument("--limit", type=int, default=2000)
+    evaluate.add_argument("--thresholds", type=float, nargs="+", default=[0.6, 0.7, 0.8, 0.9, 0.95])
+    args = parser.parse_args()
+
+    if args.command == "train":
+        ids, texts, labels = _labelled_entries(args.limit)
+        if not texts:
+            print("❌ No labelled journal entries found.")
+            return
+        # Random (seeded) hold-out so it spans the whole history, not just the oldest entries
+        order = list(range(len(texts)))
+        random.Random(0).shuffle(order)
+        split = int(len(texts) * (1 - args.holdout))
+        train_rows, holdout_rows = order[:split], order[split:]
+
+        first_stage = FirstStage.train([texts[i] for i in train_rows], [labels[i] for i in train_rows])
+        first_stage.save()
+        save_holdout([ids[i] for i in holdout_rows])
+        print(f"✅ Trained first stage on {split} entries, saved to {FIRST_STAGE_PATH}")
+        if holdout_rows:
+            predicted = first_stage.pipeline.predict([texts[i] for i in holdout_rows])
+            accuracy = np.mean([p == labels[i] for p, i in zip(predicted, holdout_rows)])
+            print(f"Hold-out agreement with stored labels: {accuracy:.2%} on {len(holdout_rows)} entries "
+                  f"(ids saved to {HOLDOUT_PATH})")
+    else:
+        from model.emotion_classifier import EmotionClassifier
+
+        if not os.path.exists(HOLDOUT_PATH):
+            print(f"❌ No hold-out found at {HOLDOUT_PATH}; run `python -m model.cascade train` first.")
+            return
+        _, texts, _ = _labelled_entries(args.limit, ids=load_holdout())
+        if not texts:
+            print("❌ None of the held-out entries are left to evaluate on.")
+            return
+
+        classifier = EmotionClassifier(cascade=False)
+        model_labels = list(classifier.id2label.values())
+        full_probs = classifier.predict_proba(texts)
+        print(f"{'THRESHOLD':>10} {'ESCALATED':>10} {'AGREEMENT':>10} {'OVERALL':>10}")
+        for row in evaluate_thresholds(FirstStage.load(), full_probs, texts, model_labels, args.thresholds):
+            agreement = f"{row['agreement']:.2%}" if row["agreement"] is not None else "n/a"
+            print(f"{row['threshold']:>10.2f} {row['escalation_rate']:>10.2%} {agreement:>10} "
+                  f"{row['overall_agreement']:>10.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# model/compiled.py
+"""
+Compiled execution for the torch backend.
+
+Inputs are padded up to a small set of sequence-length (and batch-size)
+buckets so each compiled graph is reused instead of re-traced for every
+new shape.
+
+Usage:
+    python -m model.compiled --mode torchscript
+"""
+
+import argparse
+import time
+
+import torch
+
+EXECUTION_MODES = ("eager", "torchscript", "compile")
+LENGTH_BUCKETS = (32, 64, 128, 256, 512)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+class LogitsOnly(torch.nn.Module):
+    """Wrap a HF classifier so traced, compiled and exported graphs return a plain logits tensor."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask).logits
+
+
+def bucket_for(n, buckets):
+    """Smallest bucket that fits n (the largest bucket if none does)."""
+    for size in buckets:
+        if n <= size:
+            return size
+    return buckets[-1]
+
+
+class CompiledRunner:
+    """Runs a sequence classifier through TorchScript traces or torch.compile, one graph per shape bucket."""
+
+    def __init__(self, model, mode="torchscript", pad_token_id=0, length_buckets=LENGTH_BUCKETS,
+                 batch_buckets=BATCH_BUCKETS):
+        if mode not in ("torchscript", "compile"):
+            raise ValueError(f"Unknown execution mode: {mode}")
+        self.mode = mode
+        self.pad_token_id = pad_token_id
+        self.length_buckets = length_buckets
+        self.batch_buckets = batch_buckets
+        self._module = LogitsOnly(model).eval()
+        self._traces = {}
+        if mode == "compile":
+            # Dynamo keeps at most cache_size_limit (default 8) graphs per function and silently
+            # falls back to eager beyond that, so make room for one graph per shape bucket
+            import torch._dynamo
+
+            graphs = len(length_buckets) * len(batch_buckets)
+            config = torch._dynamo.config
+            config.cache_size_limit = max(config.cache_size_limit, graphs)
+            if hasattr(config, "accumulated_cache_size_limit"):
+                config.accumulated_cache_size_limit = max(config.accumulated_cache_size_limit, graphs)
+            self._compiled = torch.compile(self._module, dynamic=False)
+
+    def _pad(self, input_ids, attention_mask):
+        batch, length = input_ids.shape
+        target_batch = max(bucket_for(batch, self.batch_buckets), batch)
+        target_length = bucket_for(length, self.length_buckets)
+        padded_ids = torch.full((target_batch, target_length), self.pad_token_id, dtype=input_ids.dtype)
+        padded_mask = torch.zeros((target_batch, target_length), dtype=attention_mask.dtype)
+        padded_ids[:batch, :length] = input_ids
+        padded_mask[:batch, :length] = attention_mask
+        # Padding rows still need one attended token to avoid an all-masked softmax
+        padded_mask[batch:, 0] = 1
+        return padded_ids, padded_mask
+
+    def _graph(self, input_ids, attention_mask):
+        if self.mode == "compile":
+            return self._compiled
+        shape = tuple(input_ids.shape)
+        if shape not in self._traces:
+            with torch.no_grad():
+                self._traces[shape] = torch.jit.freeze(
+                    torch.jit.trace(self._module, (input_ids, attention_mask), check_trace=False))
+        return self._traces[shape]
+
+    def __call__(self, input_ids, attention_mask):
+        batch = input_ids.shape[0]
+        padded_ids, padded_mask = self._pad(input_ids, attention_mask)
+        with torch.no_grad():
+            logits = self._graph(padded_ids, padded_mask)(padded_ids, padded_mask)
+        return logits[:batch]
+
+    def warmup(self, batch_sizes=None):
+        """
+        Build (trace/compile) the graph for every length bucket at the given batch sizes
+        (default: every batch bucket, since the inference queue and SHAP send multi-row batches).
+        """
+        for batch in batch_sizes or self.batch_buckets:
+            for length in self.length_buckets:
+                ids = torch.full((batch, length), self.pad_token_id, dtype=torch.long)
+                mask = torch.ones((batch, length), dtype=torch.long)
+                self(ids, mask)
+
+
+def _bucket_inputs(tokenizer, length, batch):
+    """A batch of real tokens of exactly `length` tokens (including special tokens)."""
+    text = " ".join(["feeling"] * length)
+    encoding = tokenizer([text] * batch, truncation=True, max_length=length, padding="max_length", return_tensors="pt")
+    return encoding["input_ids"], encoding["attention_mask"]
+
+
+def check_against_eager(runner, model, tokenizer, texts):
+    """Max absolute logit difference and top-1 agreement between the compiled runner and eager mode."""
+    batch = tokenizer(texts, padding=True, truncation=True, return_tensors="pt")
+    with torch.no_grad():
+        eager = model(**batch).logits.float()
+    compiled = runner(batch["input_ids"], batch["attention_mask"]).float()
+    return {
+        "max_logit_diff": float((eager - compiled).abs().max()),
+        "top1_agreement": float((eager.argmax(dim=1) == compiled.argmax(dim=1)).float().mean()),
+    }
+
+
+def benchmark(runner, model, tokenizer, batch=1, repeats=20):
+    """Per-bucket mean latency in ms for eager vs compiled execution."""
+    results = []
+    for length in runner.length_buckets:
+        ids, mask = _bucket_inputs(tokenizer, length, batch)
+        timings = {}
+        for name, fn in (("eager", lambda: model(input_ids=ids, attention_mask=mask)),
+                         ("compiled", lambda: runner(ids, mask))):
+            with torch.no_grad():
+                fn()
+                started = time.perf_counter()
+                for _ in range(repeats):
+                    fn()
+            timings[name] = (time.perf_counter() - started) / repeats * 1000
+        results.append({"length": length, "batch": batch, **timings})
+    return results
+
+
+def main():
+    from model.emotion_classifier import EmotionClassifier
+    from model.precision import SAMPLE_TEXTS
+
+    parser = argparse.ArgumentParser(description="Check and benchmark compiled execution against eager mode.")
+    parser.add_argument("--mode", choices=["torchscript", "compile"], default="torchscript")
+    parser.add_argument("--batch", type=int, default=1)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    classifier = EmotionClassifier(backend="torch", execution="eager")
+    runner = CompiledRunner(classifier.model, args.mode, pad_token_id=classifier.tokenizer.pad_token_id)
+
+    print(f"Warming up {args.mode} graphs...")
+    runner.warmup(batch_sizes=(args.batch,))
+
+    check = check_against_eager(runner, classifier.model, classifier.tokenizer, SAMPLE_TEXTS)
+    print(f"Correctness: max logit diff {check['max_logit_diff']:.2e}, top-1 agreement {check['top1_agreement']:.2%}")
+
+    print(f"{'TOKENS':>7} {'EAGER ms':>10} {'COMPILED ms':>12} {'SPEEDUP':>8}")
+    for row in benchmark(runner, classifier.model, classifier.tokenizer, args.batch, args.repeats):
+        print(f"{row['length']:>7} {row['eager']:>10.2f} {row['compiled']:>12.2f} {row['eager'] / row['compiled']:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
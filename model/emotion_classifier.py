@@ -1,24 +1,345 @@
-# model/emotion_classifier.py
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
+from transformers import AutoConfig, AutoTokenizer, AutoModelForSequenceClassification
+import functools
 import torch
 import torch.nn.functional as F
+import os
+import threading
+
+from model.prediction_cache import PredictionCache, text_key
+from model.precision import apply_precision
+from model.bundle import read_manifest
+from model.compiled import CompiledRunner
+from model.cascade import Cascade, FirstStage, FIRST_STAGE_PATH
+from utils.db import EMOTION_LABELS
+
+# Prediction cache configuration (set PREDICTION_CACHE_DB to a SQLite path to persist hits)
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", 2048))
+PREDICTION_CACHE_DB = os.getenv("PREDICTION_CACHE_DB")
+
+# Inference backend: "torch" (default) or "onnx" (onnxruntime CPU provider)
+MODEL_NAME = os.getenv("EMOTION_MODEL_NAME", "bhadresh-savani/distilbert-base-uncased-emotion")
+EMOTION_BACKEND = os.getenv("EMOTION_BACKEND", "torch")
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", os.path.join("model", "onnx"))
+
+# Local bundle written by `python -m model.bundle`; when set, loading is offline and reads safetensors weights
+EMOTION_MODEL_DIR = os.getenv("EMOTION_MODEL_DIR")
+
+# Weight precision for the torch backend: "fp32" (default), "int8" (dynamic quantization) or "bf16"
+EMOTION_PRECISION = os.getenv("EMOTION_PRECISION", "fp32")
+
+# Torch execution mode: "eager" (default), "torchscript" or "compile" (graphs reused per length bucket)
+EMOTION_EXECUTION = os.getenv("EMOTION_EXECUTION", "eager")
+
+# Cascade mode: a cheap first stage answers confident texts, the rest escalate to the full model
+EMOTION_CASCADE = os.getenv("EMOTION_CASCADE", "0") == "1"
+CASCADE_THRESHOLD = float(os.getenv("CASCADE_THRESHOLD", 0.9))
+CASCADE_AGREEMENT_SAMPLE_RATE = float(os.getenv("CASCADE_AGREEMENT_SAMPLE_RATE", 0.05))
+
+# Long-entry mode: overlapping token windows, capped to keep latency bounded
+LONG_TEXT_STRIDE = int(os.getenv("LONG_TEXT_STRIDE", 128))
+LONG_TEXT_MAX_WINDOWS = int(os.getenv("LONG_TEXT_MAX_WINDOWS", 8))
 
 class EmotionClassifier:
-    def __init__(self):
-        self.model_name = "bhadresh-savani/distilbert-base-uncased-emotion"
-        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-        self.model = AutoModelForSequenceClassification.from_pretrained(self.model_name)
-        self.model.eval()
-        self.id2label = self.model.config.id2label
-        self.label2id = self.model.config.label2id
-
-    def predict_emotion(self, text):
-        tokens = self.tokenizer(text, return_tensors="pt", truncation=True)
+    def __init__(self, backend=EMOTION_BACKEND, precision=EMOTION_PRECISION, execution=EMOTION_EXECUTION,
+                 cascade=EMOTION_CASCADE):
+        self.model_name = MODEL_NAME
+        self.backend = backend
+        self.precision = precision
+        self.execution = execution
+        self.runner = None
+        self.cascade = None
+        if cascade:
+            if not os.path.exists(FIRST_STAGE_PATH):
+                raise FileNotFoundError(f"Cascade first stage not found at {FIRST_STAGE_PATH}; run `python -m model.cascade train`")
+            self.cascade = Cascade(FirstStage.load(), CASCADE_THRESHOLD, CASCADE_AGREEMENT_SAMPLE_RATE)
+        revision = None
+        if EMOTION_MODEL_DIR:
+            manifest = read_manifest(EMOTION_MODEL_DIR)
+            self.model_name, revision = manifest["model_name"], manifest["revision"]
+            source = EMOTION_MODEL_DIR
+            load_kwargs = {"local_files_only": True}
+        else:
+            source = self.model_name
+            load_kwargs = {}
+        self.tokenizer = AutoTokenizer.from_pretrained(source, **load_kwargs)
+        if backend == "onnx":
+            if precision != "fp32" or execution != "eager":
+                raise ValueError("Reduced precision and compiled execution are only supported on the torch backend")
+            from model.onnx_backend import OnnxClassifierSession
+            self.model = None
+            # The export's config has no hub commit hash, so the revision comes from the export manifest
+            self.model_name, revision = configured_model()
+            self.session = OnnxClassifierSession(source, ONNX_MODEL_DIR, self.model_name, revision)
+            config = self.session.config
+        elif backend == "torch":
+            self.session = None
+            if EMOTION_MODEL_DIR:
+                # safetensors skips unpickling; low_cpu_mem_usage (needs accelerate) skips the random-init pass,
+                # so weights are copied into the parameters once instead of twice
+                load_kwargs.update(use_safetensors=True, low_cpu_mem_usage=True)
+            model = AutoModelForSequenceClassification.from_pretrained(source, **load_kwargs)
+            model.eval()
+            config = model.config
+            self.model = apply_precision(model, precision)
+            if execution != "eager":
+                self.runner = CompiledRunner(self.model, execution, pad_token_id=self.tokenizer.pad_token_id)
+        else:
+            raise ValueError(f"Unknown emotion backend: {backend}")
+        self.id2label = config.id2label
+        self.label2id = config.label2id
+        # Stored probability vectors have one fixed column per emotion, so a checkpoint with other labels
+        # is rejected here rather than failing on every save
+        labels = {label.lower() for label in self.id2label.values()}
+        if labels != set(EMOTION_LABELS):
+            raise ValueError(f"{self.model_name} predicts {sorted(labels)}, but journal entries store "
+                             f"probabilities for {list(EMOTION_LABELS)}; use a checkpoint with those labels")
+        revision = revision or getattr(config, "_commit_hash", None) or "main"
+        self.model_version = f"{self.model_name}@{revision}"
+        # Cached logits are only reusable under the same backend and precision
+        self.cache_namespace = f"{self.model_version}/{backend}/{precision}"
+        self.cache = PredictionCache(max_size=PREDICTION_CACHE_SIZE, db_path=PREDICTION_CACHE_DB)
+
+    def _rank(self, probs):
+        labels = list(self.id2label.values())
+        return sorted(zip(labels, probs), key=lambda x: x[1], reverse=True)
+
+    def _forward(self, batch):
+        """Logits for one padded batch on whichever backend is configured."""
+        if self.session is not None:
+            return self.session(batch["input_ids"], batch["attention_mask"])
+        if self.runner is not None:
+            return self.runner(batch["input_ids"], batch["attention_mask"]).float()
         with torch.no_grad():
-            outputs = self.model(**tokens)
-        probs = F.softmax(outputs.logits, dim=1).squeeze().tolist()
+            return self.model(**batch).logits.float()
+
+    def warmup(self):
+        """Run a dummy forward pass (bypassing the cache) so the first real request skips allocation/JIT costs."""
+        if self.runner is not None:
+            self.runner.warmup()
+        self._compute_logits(["Warming up the emotion model."])
+
+    def predict_proba(self, texts, batch_size=32, max_batch_tokens=None):
+        """
+        Uncached softmax probabilities as a NumPy array (used for SHAP masked variants).
+        Identical texts are run once; max_batch_tokens caps padded tokens per forward pass.
+        """
+        texts = [str(t) for t in texts]
+        unique = list(dict.fromkeys(texts))
+        logits = self._compute_logits(unique, batch_size=batch_size, max_batch_tokens=max_batch_tokens)
+        probs = F.softmax(logits, dim=1).numpy()
+        if len(unique) == len(texts):
+            return probs
+        index = {text: i for i, text in enumerate(unique)}
+        return probs[[index[text] for text in texts]]
+
+    def predict_emotion(self, text, input_ids=None):
+        return self.predict_emotions([text], input_ids=None if input_ids is None else [input_ids])[0]
+
+    def predict_logits(self, texts, batch_size=32, input_ids=None):
+        """
+        Logits for many texts in input order, served from the prediction cache where possible.
+        Pass input_ids (one list per text) to reuse an existing tokenization.
+        """
+        texts = [str(t) for t in texts]
+        keys = [text_key(t, self.cache_namespace) for t in texts]
+        cached = self.cache.get_many(keys)
+
+        misses = {}
+        for i, key in enumerate(keys):
+            if key not in cached:
+                misses.setdefault(key, i)
+        if misses:
+            computed = self._compute_logits(
+                [texts[i] for i in misses.values()],
+                batch_size=batch_size,
+                input_ids=None if input_ids is None else [input_ids[i] for i in misses.values()],
+            )
+            fresh = dict(zip(misses.keys(), computed.tolist()))
+            self.cache.put_many(fresh.items())
+            cached.update(fresh)
+
+        if not texts:
+            return torch.empty(0, len(self.id2label))
+        return torch.tensor([cached[key] for key in keys])
+
+    def _truncate(self, ids):
+        max_length = self.tokenizer.model_max_length
+        if len(ids) <= max_length:
+            return ids
+        return ids[:max_length - 1] + [self.tokenizer.sep_token_id]
+
+    def _batches(self, order, lengths, batch_size, max_batch_tokens):
+        """Split length-sorted indices into batches of at most batch_size texts and max_batch_tokens padded tokens."""
+        batch = []
+        for i in order:
+            # Lengths are ascending, so the padded size of a batch is (count x newest length)
+            if batch and (len(batch) == batch_size or
+                          (max_batch_tokens and (len(batch) + 1) * lengths[i] > max_batch_tokens)):
+                yield batch
+                batch = []
+            batch.append(i)
+        if batch:
+            yield batch
+
+    def _compute_logits(self, texts, batch_size=32, input_ids=None, max_batch_tokens=None):
+        """
+        Run many texts through the model and return their logits in input order.
+        Texts are sorted by token length so each batch is padded only to its own longest text.
+        """
+        if not texts:
+            return torch.empty(0, len(self.id2label))
+
+        if input_ids is None:
+            encodings = self.tokenizer(texts, truncation=True)["input_ids"]
+        else:
+            encodings = [self._truncate(list(ids)) for ids in input_ids]
+        lengths = [len(ids) for ids in encodings]
+        order = sorted(range(len(texts)), key=lambda i: lengths[i])
+
+        logits = [None] * len(texts)
+        for bucket in self._batches(order, lengths, batch_size, max_batch_tokens):
+            batch = self.tokenizer.pad(
+                {"input_ids": [encodings[i] for i in bucket]},
+                padding=True,
+                return_tensors="pt",
+            )
+            for i, row in zip(bucket, self._forward(batch)):
+                logits[i] = row
+        return torch.stack(logits)
+
+    def is_long(self, text, input_ids=None):
+        """True if the text (or its already computed input_ids) would be truncated by a single forward pass."""
+        if input_ids is None:
+            input_ids = self.tokenizer(str(text))["input_ids"]
+        return len(input_ids) > self.tokenizer.model_max_length
+
+    def predict_long_emotion(self, text, pooling="length", stride=LONG_TEXT_STRIDE, max_windows=LONG_TEXT_MAX_WINDOWS):
+        """
+        Classify a long entry with overlapping token windows instead of truncating it.
+        Window probabilities are pooled by token-length weighting ("length") or per-emotion max ("max").
+        Returns (ranked emotions, per-window breakdown).
+        """
+        encoding = self.tokenizer(
+            str(text),
+            truncation=True,
+            max_length=self.tokenizer.model_max_length,
+            stride=stride,
+            return_overflowing_tokens=True,
+            return_special_tokens_mask=True,
+        )
+        windows = encoding["input_ids"][:max_windows]
+        lengths = [mask.count(0) for mask in encoding["special_tokens_mask"][:max_windows]]
+
+        batch = self.tokenizer.pad({"input_ids": windows}, padding=True, return_tensors="pt")
+        probs = F.softmax(self._forward(batch), dim=1)
+
+        if pooling == "max":
+            pooled = probs.max(dim=0).values
+            pooled = pooled / pooled.sum()
+        elif pooling == "length":
+            weights = torch.tensor(lengths, dtype=probs.dtype)
+            pooled = (probs * (weights / weights.sum()).unsqueeze(1)).sum(dim=0)
+        else:
+            raise ValueError(f"Unknown pooling: {pooling}")
+
+        breakdown = [
+            {
+                "window": i,
+                "tokens": n_tokens,
+                "text": self.tokenizer.decode(ids, skip_special_tokens=True),
+                "emotions": self._rank(p),
+            }
+            for i, (ids, n_tokens, p) in enumerate(zip(windows, lengths, probs.tolist()))
+        ]
+        return self._rank(pooled.tolist()), breakdown
+
+    def predict_emotions(self, texts, batch_size=32, input_ids=None, use_cascade=True):
+        """
+        Batched version of predict_emotion.
+        Returns a list of (ranked emotions, logits, model_version) triples, one per input text;
+        model_version names the stage that answered. In cascade mode, confident first-stage
+        answers return log-probabilities as their logits. use_cascade=False always runs the full model.
+        """
+        if self.cascade is None or not use_cascade:
+            return self._predict_full(texts, batch_size, input_ids)
+
+        texts = [str(t) for t in texts]
         labels = list(self.id2label.values())
-        return sorted(zip(labels, probs), key=lambda x: x[1], reverse=True), outputs.logits
+        probs, answered, escalate, sampled = self.cascade.split(texts, labels)
+
+        results = [None] * len(texts)
+        full_indices = sorted(set(escalate) | set(sampled))
+        if full_indices:
+            full = dict(zip(full_indices, self._predict_full(
+                [texts[i] for i in full_indices],
+                batch_size,
+                None if input_ids is None else [input_ids[i] for i in full_indices],
+            )))
+            for i in escalate:
+                results[i] = full[i]
+            self.cascade.record_agreement([labels[probs[i].argmax()] for i in sampled],
+                                          [full[i][0][0][0] for i in sampled])
+        for i in answered:
+            first_stage = torch.from_numpy(probs[i])
+            results[i] = (self._rank(first_stage.tolist()), first_stage.clamp_min(1e-12).log().unsqueeze(0),
+                          self.cascade.first_stage.version)
+        return results
+
+    def _predict_full(self, texts, batch_size=32, input_ids=None):
+        logits = self.predict_logits(texts, batch_size=batch_size, input_ids=input_ids)
+        probs = F.softmax(logits, dim=1).tolist()
+        return [(self._rank(p), l.unsqueeze(0), self.model_version) for p, l in zip(probs, logits)]
+
+# Shared instance, created on first use so pages that never run inference start instantly
+_model = None
+_model_lock = threading.Lock()
+
+def cascade_stats():
+    """Live escalation and agreement counters of the shared model's cascade, or None if it isn't running."""
+    if _model is None or _model.cascade is None:
+        return None
+    return _model.cascade.stats()
+
+def current_cache_namespace():
+    """
+    cache_namespace of the shared model. If it has not been loaded yet this is resolved from
+    the config alone, so cache lookups don't force a full model load.
+    """
+    if _model is not None:
+        return _model.cache_namespace
+    return _config_cache_namespace()
+
+@functools.lru_cache(maxsize=1)
+def configured_model():
+    """(model_name, revision) of the configured model, from the bundle manifest or the hub config."""
+    if EMOTION_MODEL_DIR:
+        manifest = read_manifest(EMOTION_MODEL_DIR)
+        return manifest["model_name"], manifest["revision"]
+    return MODEL_NAME, getattr(AutoConfig.from_pretrained(MODEL_NAME), "_commit_hash", None) or "main"
+
+@functools.lru_cache(maxsize=1)
+def _config_cache_namespace():
+    model_name, revision = configured_model()
+    return f"{model_name}@{revision}/{EMOTION_BACKEND}/{EMOTION_PRECISION}"
+
+def get_tokenizer():
+    """The shared model's tokenizer; loads only the tokenizer if the model isn't loaded yet."""
+    if _model is not None:
+        return _model.tokenizer
+    return _config_tokenizer()
+
+@functools.lru_cache(maxsize=1)
+def _config_tokenizer():
+    if EMOTION_MODEL_DIR:
+        return AutoTokenizer.from_pretrained(EMOTION_MODEL_DIR, local_files_only=True)
+    return AutoTokenizer.from_pretrained(MODEL_NAME)
+
+def get_model():
+    """Return the process-wide EmotionClassifier, loading it on first call (thread-safe)."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = EmotionClassifier()
+    return _model
 
-# Export singleton instance
-model_loader = EmotionClassifier()
@@ -0,0 +1,89 @@
+# model/onnx_backend.py
+import json
+import os
+
+import torch
+from transformers import AutoConfig, AutoTokenizer, AutoModelForSequenceClassification
+
+from model.bundle import MANIFEST, read_manifest
+from model.compiled import LogitsOnly
+
+
+def export_onnx(model_name_or_path, output_dir, model_name=None, revision=None):
+    """
+    Export a sequence-classification checkpoint to output_dir/model.onnx.
+    The tokenizer and config are saved alongside so the directory is self-contained,
+    with a manifest recording the model_name and revision the export was made from.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name_or_path)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name_or_path)
+    model.eval()
+
+    sample = tokenizer("onnx export sample", return_tensors="pt")
+    torch.onnx.export(
+        LogitsOnly(model),
+        (sample["input_ids"], sample["attention_mask"]),
+        os.path.join(output_dir, "model.onnx"),
+        input_names=["input_ids", "attention_mask"],
+        output_names=["logits"],
+        dynamic_axes={
+            "input_ids": {0: "batch", 1: "sequence"},
+            "attention_mask": {0: "batch", 1: "sequence"},
+            "logits": {0: "batch"},
+        },
+        opset_version=14,
+    )
+    tokenizer.save_pretrained(output_dir)
+    model.config.save_pretrained(output_dir)
+    with open(os.path.join(output_dir, MANIFEST), "w") as f:
+        json.dump({
+            "model_name": model_name or model_name_or_path,
+            "revision": revision or getattr(model.config, "_commit_hash", None) or "main",
+        }, f, indent=2)
+    return output_dir
+
+
+def export_matches(output_dir, model_name, revision):
+    """True if output_dir holds an export of exactly this model_name and revision."""
+    if not os.path.exists(os.path.join(output_dir, "model.onnx")):
+        return False
+    try:
+        manifest = read_manifest(output_dir)
+    except (OSError, ValueError):
+        return False
+    return manifest.get("model_name") == model_name and manifest.get("revision") == revision
+
+
+class OnnxClassifierSession:
+    """
+    Serves logits from an exported model through onnxruntime's CPU provider.
+    (Re-)exports the checkpoint if output_dir has no export of model_name at revision yet.
+    """
+
+    def __init__(self, model_name_or_path, output_dir, model_name, revision, num_threads=None):
+        import onnxruntime as ort
+
+        model_path = os.path.join(output_dir, "model.onnx")
+        if not export_matches(output_dir, model_name, revision):
+            export_onnx(model_name_or_path, output_dir, model_name, revision)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.config = AutoConfig.from_pretrained(output_dir)
+        self.model_dir = output_dir
+        self.model_name = model_name
+        self.revision = revision
+
+    def __call__(self, input_ids, attention_mask):
+        logits = self.session.run(
+            ["logits"],
+            {
+                "input_ids": input_ids.numpy().astype("int64"),
+                "attention_mask": attention_mask.numpy().astype("int64"),
+            },
+        )[0]
+        return torch.from_numpy(logits)
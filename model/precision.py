@@ -0,0 +1,84 @@
+# model/precision.py
+import argparse
+
+import numpy as np
+import torch
+
+PRECISIONS = ("fp32", "int8", "bf16")
+
+# Small built-in sample set covering all six emotions
+SAMPLE_TEXTS = [
+    "I finally got the job and I can't stop smiling.",
+    "Today was a good day, I spent the afternoon with friends.",
+    "I miss my grandmother so much, the house feels empty.",
+    "Nothing I do seems to matter anymore.",
+    "I am furious that they cancelled without telling me.",
+    "Stop interrupting me, it makes me so angry.",
+    "I'm scared about the test results tomorrow.",
+    "Walking home alone at night makes me nervous.",
+    "I love the way she laughs at my terrible jokes.",
+    "Holding my baby for the first time filled me with tenderness.",
+    "I can't believe they threw me a surprise party!",
+    "Wow, I did not expect the results to come back so fast.",
+]
+
+
+def apply_precision(model, precision):
+    """Return the torch model converted to the requested precision."""
+    if precision == "fp32":
+        return model
+    if precision == "int8":
+        # Dynamic quantization: Linear weights stored as int8, activations quantized on the fly
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    if precision == "bf16":
+        return model.to(torch.bfloat16)
+    raise ValueError(f"Unknown precision: {precision}. Expected one of {PRECISIONS}")
+
+
+def precision_agreement(candidate, reference, texts=SAMPLE_TEXTS):
+    """
+    Compare a reduced-precision classifier against an fp32 reference.
+    Returns top-1 label agreement and the maximum absolute probability drift.
+    """
+    ref_probs = reference.predict_proba(texts)
+    cand_probs = candidate.predict_proba(texts)
+    agreement = float(np.mean(ref_probs.argmax(axis=1) == cand_probs.argmax(axis=1)))
+    drift = np.abs(ref_probs - cand_probs)
+    return {
+        "precision": candidate.precision,
+        "samples": len(texts),
+        "top1_agreement": agreement,
+        "max_prob_drift": float(drift.max()),
+        "mean_prob_drift": float(drift.mean()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check reduced-precision agreement against fp32.")
+    parser.add_argument("--precision", choices=["int8", "bf16"], nargs="+", default=["int8", "bf16"])
+    parser.add_argument("--from-db", type=int, default=0, metavar="N",
+                        help="Also sample the N most recent journal entries from the database")
+    args = parser.parse_args()
+
+    from model.emotion_classifier import EmotionClassifier
+
+    texts = list(SAMPLE_TEXTS)
+    if args.from_db:
+        from utils.db import get_connection
+        conn = get_connection()
+        c = conn.cursor()
+        c.execute("SELECT entry FROM journal_entries ORDER BY timestamp DESC LIMIT ?", (args.from_db,))
+        texts += [row[0] for row in c.fetchall() if row[0]]
+        conn.close()
+
+    reference = EmotionClassifier(backend="torch", precision="fp32")
+    for precision in args.precision:
+        candidate = EmotionClassifier(backend="torch", precision=precision)
+        report = precision_agreement(candidate, reference, texts)
+        print(f"{report['precision']}: top-1 agreement {report['top1_agreement']:.2%}, "
+              f"max drift {report['max_prob_drift']:.4f}, mean drift {report['mean_prob_drift']:.4f} "
+              f"over {report['samples']} samples")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+# model/prediction_cache.py
+import hashlib
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from datetime import datetime
+
+
+def normalize_text(text):
+    """Collapse whitespace and case so trivially different submissions share a cache entry."""
+    return " ".join(str(text).split()).lower()
+
+
+def text_key(text, model_id):
+    """Content address for a text under a given model name/revision."""
+    payload = f"{model_id}\n{normalize_text(text)}"
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class PredictionCache:
+    """
+    In-memory LRU of logits keyed by text_key, optionally backed by a
+    SQLite table so hits survive restarts.
+    """
+
+    def __init__(self, max_size=2048, db_path=None, max_db_rows=100000):
+        self.max_size = max_size
+        self.db_path = db_path
+        self.max_db_rows = max_db_rows
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if self.db_path:
+            self._create_table()
+
+    # ------------------------
+    # SQLITE BACKING
+    # ------------------------
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, check_same_thread=False)
+
+    def _create_table(self):
+        conn = self._connect()
+        c = conn.cursor()
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS prediction_cache (
+                key TEXT PRIMARY KEY,
+                logits BLOB,
+                last_used TIMESTAMP
+            )
+        """)
+        c.execute("CREATE INDEX IF NOT EXISTS idx_prediction_cache_last_used ON prediction_cache(last_used)")
+        conn.commit()
+        conn.close()
+
+    def _db_get(self, keys):
+        conn = self._connect()
+        c = conn.cursor()
+        placeholders = ",".join("?" * len(keys))
+        c.execute(f"SELECT key, logits FROM prediction_cache WHERE key IN ({placeholders})", keys)
+        rows = {key: array("f", blob).tolist() for key, blob in c.fetchall()}
+        if rows:
+            c.executemany("UPDATE prediction_cache SET last_used=? WHERE key=?",
+                          [(datetime.now(), key) for key in rows])
+            conn.commit()
+        conn.close()
+        return rows
+
+    def _db_put(self, items):
+        conn = self._connect()
+        c = conn.cursor()
+        now = datetime.now()
+        c.executemany("INSERT OR REPLACE INTO prediction_cache (key, logits, last_used) VALUES (?, ?, ?)",
+                      [(key, array("f", logits).tobytes(), now) for key, logits in items])
+        # Evict least recently used rows beyond the size bound
+        c.execute("""
+            DELETE FROM prediction_cache WHERE key IN (
+                SELECT key FROM prediction_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_db_rows,))
+        conn.commit()
+        conn.close()
+
+    # ------------------------
+    # PUBLIC API
+    # ------------------------
+
+    def get_many(self, keys):
+        """Return {key: logits} for every key found in memory or SQLite."""
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[key] = self._entries[key]
+        missing = [key for key in keys if key not in found]
+        if missing and self.db_path:
+            from_db = self._db_get(missing)
+            found.update(from_db)
+            with self._lock:
+                for key, logits in from_db.items():
+                    self._remember(key, logits)
+        with self._lock:
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+        return found
+
+    def put_many(self, items):
+        """Store (key, logits) pairs."""
+        items = [(key, list(logits)) for key, logits in items]
+        if not items:
+            return
+        with self._lock:
+            for key, logits in items:
+                self._remember(key, logits)
+        if self.db_path:
+            self._db_put(items)
+
+    def _remember(self, key, logits):
+        self._entries[key] = logits
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self._entries),
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
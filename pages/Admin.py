@@ -13,6 +13,7 @@ from utils.db import (
     delete_user_and_entries, get_database_size
 )
 from utils.admin_auth import require_admin
+from model.emotion_classifier import cascade_stats
 from utils.auth import clear_persistent_admin_login
 
 # Check admin authentication
@@ -365,6 +366,24 @@ with tab5:
     with col3:
         st.metric("System Status", "🟢 Healthy")
     
+    # Emotion cascade (live counters of this server process)
+    st.markdown("#### 🪜 Emotion Cascade")
+    stats = cascade_stats()
+    if stats is None:
+        st.caption("The cascade is disabled (EMOTION_CASCADE=0) or the model has not been loaded in this process yet.")
+    else:
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Threshold", f"{stats['threshold']:.2f}")
+        with col2:
+            st.metric("Texts Routed", stats["total"])
+        with col3:
+            st.metric("Escalation Rate", f"{stats['escalation_rate']:.1%}")
+        with col4:
+            agreement = stats["agreement"]
+            st.metric("Sampled Agreement", f"{agreement:.1%}" if agreement is not None else "n/a",
+                      help=f"First stage vs DistilBERT on {stats['agreement_checked']} sampled answers")
+    
     # User Management
     st.markdown("#### 👥 User Management")
     
@@ -1,8 +1,15 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from utils.db import get_entries, delete_entry, get_entries_grouped_by_date
+from utils.db import (get_entries, delete_entry, get_entries_grouped_by_date, get_entry_probabilities, EMOTION_LABELS,
+                      get_word_drivers, get_word_driver_coverage)
 from utils.auth import require_login
+from utils.explanation_cache import explain_cached
+from model.emotion_classifier import get_tokenizer
+from utils.tokenizer_utils import top_word_scores, word_attributions
+from utils.word_drivers import submit_index_update
+import nltk
+from nltk.corpus import stopwords
 require_login()
 
 # Show sidebar
@@ -12,6 +19,9 @@ show_sidebar()
 
 
 
+nltk.download('stopwords', quiet=True)
+stop_words = set(stopwords.words('english'))
+
 st.title("📖 Your Journal History")
 
 user = st.session_state["user"]
@@ -42,6 +52,10 @@ try:
                 (filtered_df["Timestamp"].dt.date <= end_date)
             ]
 
+        # Stored probability vectors, keyed by entry id
+        prob_ids, _, prob_matrix = get_entry_probabilities(user)
+        entry_probs = dict(zip(prob_ids, prob_matrix))
+
         if filtered_df.empty:
             st.info("No entries match the selected filters.")
         else:
@@ -50,10 +64,50 @@ try:
                 with st.expander(f"{row['Timestamp']} - {row['Emotion'].title()}"):
                     st.write(f"**Entry:** {row['Entry']}")
                     st.write(f"**Confidence:** {row['Confidence']:.2f}")
+                    if row["ID"] in entry_probs:
+                        ranked = sorted(zip(EMOTION_LABELS, entry_probs[row["ID"]]), key=lambda x: x[1], reverse=True)
+                        secondary, secondary_score = ranked[1]
+                        st.write(f"**Secondary Emotion:** {secondary.title()} ({secondary_score:.2f})")
+
+                    # Why this emotion? Looked up (explanation cache first) only when asked, and the
+                    # key words kept in session state so reruns don't query or re-tokenize every entry
+                    explained = st.session_state.setdefault("explained_entries", {})
+                    explained_key = (row["ID"], row["Emotion"])
+                    if explained_key not in explained and st.button("🔍 Why this emotion?", key=f"explain_{row['ID']}"):
+                        with st.spinner("Explaining..."):
+                            attribution = explain_cached(row["Entry"], [row["Emotion"]])
+                            encoding = get_tokenizer()(row["Entry"], return_offsets_mapping=True)
+                            words, word_scores = word_attributions(encoding, row["Entry"],
+                                                                   attribution.scores(row["Emotion"]))
+                            explained[explained_key] = top_word_scores(words, word_scores, stop_words, limit=5)
+                    if explained_key in explained:
+                        top_words = explained[explained_key]
+                        if top_words:
+                            st.write("**Key words:** " + ", ".join(
+                                f"{word} ({score:+.3f})" for word, _, score in top_words))
                     if st.button("Delete Entry", key=row["ID"]):
                         delete_entry(row["ID"])
                         st.switch_page("pages/History.py")
 
+        # 🔎 Words driving each emotion across the whole journal, read from the precomputed index
+        st.subheader("🔎 What Drives Your Emotions")
+        indexed, total = get_word_driver_coverage(user)
+        driver_emotion = st.selectbox("Emotion", EMOTION_LABELS, format_func=str.title, key="driver_emotion")
+        drivers = [row for row in get_word_drivers(user, driver_emotion, limit=30) if row[0] not in stop_words][:15]
+        if drivers:
+            drivers_df = pd.DataFrame(drivers, columns=["Word", "Impact", "Entries"])
+            fig_drivers = px.bar(drivers_df, x="Impact", y="Word", orientation="h", hover_data=["Entries"],
+                                 title=f"Words Driving {driver_emotion.title()}")
+            fig_drivers.update_layout(yaxis={"categoryorder": "total ascending"})
+            st.plotly_chart(fig_drivers, use_container_width=True)
+        else:
+            st.info(f"No words linked to {driver_emotion} yet.")
+        if indexed < total:
+            st.caption(f"{indexed} of {total} entries analyzed.")
+            if st.button("🔄 Explain my history"):
+                submit_index_update(user)
+                st.success("Analyzing your entries in the background – check back in a minute.")
+
         # 📅 Enhanced Mood Calendar Visualization
         st.subheader("📆 Your Mood Calendar")
         
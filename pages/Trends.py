@@ -2,7 +2,7 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from utils.db import get_entries
+from utils.db import get_entries, get_entry_probabilities, EMOTION_LABELS
 from utils.auth import require_login
 require_login()
 
@@ -51,5 +51,20 @@ try:
 
             st.plotly_chart(fig, use_container_width=True)
 
+            # Mixed-mood view from the stored probability vectors (no model inference needed)
+            entry_ids, timestamps, probs = get_entry_probabilities(user)
+            if len(entry_ids):
+                prob_df = pd.DataFrame(probs, columns=[label.title() for label in EMOTION_LABELS])
+                prob_df["Date"] = pd.to_datetime(timestamps).date
+                prob_df = prob_df[(prob_df["Date"] >= start_date) & (prob_df["Date"] <= end_date)]
+                if not prob_df.empty:
+                    daily_mix = prob_df.groupby("Date").mean().reset_index().melt(
+                        id_vars="Date", var_name="Emotion", value_name="Share")
+                    st.subheader("🎨 Mixed Mood Over Time")
+                    fig_mix = px.area(daily_mix, x="Date", y="Share", color="Emotion",
+                                      title="Average Emotion Mix per Day", height=450)
+                    fig_mix.update_layout(yaxis_title="Average Probability", yaxis_range=[0, 1])
+                    st.plotly_chart(fig_mix, use_container_width=True)
+
 except Exception as e:
     st.error(f"An error occurred while loading entries: {e}")
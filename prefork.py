@@ -0,0 +1,130 @@
+# prefork.py
+"""
+Pre-fork launcher for running several Streamlit workers on one host.
+
+The emotion model is loaded once in this parent process,
+then each worker is forked from it so the weight pages are shared
+copy-on-write instead of duplicated per worker.
+
+Usage:
+    python prefork.py --workers 4 --base-port 8501
+"""
+
+import argparse
+import gc
+import os
+import signal
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_shared_model():
+    """
+    Load and warm the model in the parent, then mark its weights read-only and shared.
+    SHAP explainers are per-thread, so each worker builds its own on first use.
+    """
+    import torch
+    from model.emotion_classifier import get_model
+
+    # Keep the parent single-threaded so no OpenMP pool exists at fork time
+    torch.set_num_threads(1)
+
+    classifier = get_model()
+    classifier.warmup()
+
+    if classifier.model is not None:
+        for tensor in list(classifier.model.parameters()) + list(classifier.model.buffers()):
+            tensor.requires_grad_(False)
+            tensor.share_memory_()
+
+    # Move everything allocated so far out of the GC's reach so collections in
+    # the workers don't write to (and un-share) the parent's object pages
+    gc.collect()
+    gc.freeze()
+    return classifier
+
+
+def memory_usage(pid):
+    """Return (rss, pss, uss) in MB for a process, read from /proc/<pid>/smaps_rollup."""
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1])
+    except OSError:
+        return None
+    uss = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    return fields.get("Rss", 0) / 1024, fields.get("Pss", 0) / 1024, uss / 1024
+
+
+def run_worker(port, threads):
+    """Child process: start a Streamlit server on the given port."""
+    import torch
+    from streamlit.web import cli
+
+    torch.set_num_threads(threads)
+    sys.argv = ["streamlit", "run", "app.py", "--server.port", str(port)]
+    sys.exit(cli.main())
+
+
+def report(workers):
+    print(f"{'PID':>8} {'PORT':>6} {'RSS MB':>10} {'PSS MB':>10} {'UNIQUE MB':>10}")
+    for pid, port in workers.items():
+        usage = memory_usage(pid)
+        if usage:
+            rss, pss, uss = usage
+            print(f"{pid:>8} {port:>6} {rss:>10.1f} {pss:>10.1f} {uss:>10.1f}")
+    sys.stdout.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fork Streamlit workers that share one copy of the model.")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--base-port", type=int, default=8501)
+    parser.add_argument("--threads", type=int, default=None,
+                        help="Torch threads per worker (default: CPU count / workers)")
+    parser.add_argument("--report-every", type=int, default=60, help="Seconds between memory reports (0 to disable)")
+    args = parser.parse_args()
+
+    threads = args.threads or max(1, (os.cpu_count() or 1) // args.workers)
+
+    print("🧠 Loading emotion model in the parent process...")
+    load_shared_model()
+
+    workers = {}
+    for i in range(args.workers):
+        port = args.base_port + i
+        pid = os.fork()
+        if pid == 0:
+            run_worker(port, threads)
+        workers[pid] = port
+        print(f"✅ Worker {pid} listening on port {port}")
+
+    def shutdown(signum, frame):
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        sys.exit(0)
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    last_report = 0
+    while workers:
+        pid, _ = os.waitpid(-1, os.WNOHANG)
+        if pid:
+            print(f"⚠️  Worker {pid} on port {workers.pop(pid)} exited")
+        if args.report_every and time.monotonic() - last_report >= args.report_every:
+            report(workers)
+            last_report = time.monotonic()
+        time.sleep(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+# utils/analysis.py
+from model.emotion_classifier import get_model
+
+
+class Analysis:
+    """
+    One journal entry tokenized once (with offsets) and shared by the forward pass,
+    the explainer and word aggregation (utils.tokenizer_utils.word_attributions).
+    """
+
+    def __init__(self, text, predict=None):
+        model = get_model()
+        self.text = text
+        self.encoding = model.tokenizer(text, return_offsets_mapping=True)
+        self.input_ids = self.encoding["input_ids"]
+        self.logits = None
+        self.windows = None
+
+        if model.is_long(text, input_ids=self.input_ids):
+            # Long entries are classified window by window instead of being truncated
+            self.emotions, self.windows = model.predict_long_emotion(text)
+            self.model_version = model.model_version
+        else:
+            predict = predict or model.predict_emotion
+            # model_version names the stage that answered (the cascade's first stage or the full model)
+            self.emotions, self.logits, self.model_version = predict(text, input_ids=self.input_ids)
+
+    @property
+    def probabilities(self):
+        """{label: probability} for every emotion."""
+        return dict(self.emotions)
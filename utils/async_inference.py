@@ -0,0 +1,43 @@
+# utils/async_inference.py
+"""
+Asyncio-native wrappers around prediction and SHAP explanation.
+
+Blocking work runs on a bounded thread pool so a caller can await several
+operations for the same request concurrently, e.g.
+
+    emotions, shap_values = await asyncio.gather(
+        predict_emotion_async(text), explain_text_async(text))
+"""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from utils.inference_queue import inference_queue
+from utils.shap_explainer import explain_text
+
+ASYNC_INFERENCE_WORKERS = int(os.getenv("ASYNC_INFERENCE_WORKERS", 4))
+
+_executor = ThreadPoolExecutor(max_workers=ASYNC_INFERENCE_WORKERS, thread_name_prefix="async-inference")
+
+
+async def run_in_executor(fn, *args, **kwargs):
+    """Await any blocking call (DB writes, tokenization, ...) on the shared bounded pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, partial(fn, *args, **kwargs))
+
+
+async def predict_emotion_async(text, input_ids=None):
+    """Awaitable predict_emotion; requests are micro-batched with every other session's."""
+    return await asyncio.wrap_future(inference_queue.submit(text, input_ids=input_ids))
+
+
+async def predict_emotions_async(texts):
+    """Await predictions for many texts; they share the inference queue's batches."""
+    return await asyncio.gather(*(predict_emotion_async(text) for text in texts))
+
+
+async def explain_text_async(text, **kwargs):
+    """Awaitable explain_text, offloaded to the bounded pool."""
+    return await run_in_executor(explain_text, text, **kwargs)
@@ -0,0 +1,33 @@
+# utils/attribution.py
+import numpy as np
+
+
+class Attribution:
+    """
+    Compact explanation of one text: its token strings and a (tokens x labels)
+    attribution matrix, independent of the engine that produced it.
+    """
+
+    def __init__(self, tokens, labels, values, base_values=None, budget=None, cached=False):
+        self.tokens = list(tokens)
+        self.labels = [label.lower() for label in labels]
+        self.values = np.asarray(values, dtype=np.float32).reshape(len(self.tokens), len(self.labels))
+        self.base_values = None if base_values is None else np.asarray(base_values, dtype=np.float32)
+        self.budget = budget or {}
+        self.cached = cached
+
+    @classmethod
+    def from_shap(cls, shap_values):
+        """Convert a single-text SHAP Explanation (as returned by explain_text)."""
+        row = shap_values[0]
+        return cls(
+            tokens=[str(token) for token in row.data],
+            labels=shap_values.output_names,
+            values=row.values,
+            base_values=row.base_values,
+            budget=getattr(shap_values, "budget", None),
+        )
+
+    def scores(self, label):
+        """Per-token attributions for one label."""
+        return self.values[:, self.labels.index(label.lower())]
@@ -2,9 +2,13 @@
 import sqlite3
 from datetime import datetime
 import hashlib
+import numpy as np
 
 DB_PATH = "mental_health.db"
 
+# Fixed column order of the per-entry probability vector stored in journal_entries.probs
+EMOTION_LABELS = ("anger", "fear", "joy", "love", "sadness", "surprise")
+
 def get_connection():
     return sqlite3.connect(DB_PATH, check_same_thread=False)
 
@@ -36,9 +40,42 @@ def init_db():
         )
     """)
 
+    # Migrations for columns added after the original schema
+    add_column_if_missing(c, "journal_entries", "model_version", "TEXT")
+    add_column_if_missing(c, "journal_entries", "probs", "BLOB")
+    # Keyset order for the stale re-score; the old (model_version, timestamp) index could not serve its predicate
+    c.execute("DROP INDEX IF EXISTS idx_journal_entries_model_version")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_journal_entries_timestamp_id ON journal_entries(timestamp, id)")
+
+    # Per-user word driver index: cumulative attribution of each word toward each emotion
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS word_drivers (
+            user TEXT,
+            word TEXT,
+            emotion TEXT,
+            impact REAL,
+            entries INTEGER,
+            PRIMARY KEY (user, word, emotion)
+        )
+    """)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS word_driver_progress (
+            user TEXT PRIMARY KEY,
+            last_id INTEGER,
+            entries_done INTEGER,
+            updated_at TIMESTAMP
+        )
+    """)
+
     conn.commit()
     conn.close()
 
+def add_column_if_missing(c, table, column, column_type):
+    """Add a column to an existing table unless it is already there."""
+    c.execute(f"PRAGMA table_info({table})")
+    if column not in [row[1] for row in c.fetchall()]:
+        c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
 # ------------------------
 # AUTHENTICATION HELPERS
 # ------------------------
@@ -74,22 +111,73 @@ def login_user(email, password):
 # JOURNAL ENTRY HELPERS
 # ------------------------
 
-def add_entry(user, entry, emotion, confidence):
+def encode_probabilities(probs):
+    """Pack a {label: probability} dict into a float16 blob in EMOTION_LABELS order."""
+    if probs is None:
+        return None
+    probs = {label.lower(): p for label, p in dict(probs).items()}
+    if set(probs) != set(EMOTION_LABELS):
+        raise ValueError(f"Expected probabilities for {EMOTION_LABELS}, got {sorted(probs)}")
+    return np.array([probs[label] for label in EMOTION_LABELS], dtype=np.float16).tobytes()
+
+def decode_probabilities(blob):
+    """Unpack a probs blob into a float32 array in EMOTION_LABELS order."""
+    return np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+
+def add_entry(user, entry, emotion, confidence, model_version=None, probs=None):
+    """Save a journal entry, stamped with the model version that scored it and its full probability vector."""
     conn = get_connection()
     c = conn.cursor()
-    c.execute("INSERT INTO journal_entries (user, entry, emotion, confidence, timestamp) VALUES (?, ?, ?, ?, ?)",
-              (user, entry, emotion, confidence, datetime.now()))
+    c.execute("INSERT INTO journal_entries (user, entry, emotion, confidence, timestamp, model_version, probs) VALUES (?, ?, ?, ?, ?, ?, ?)",
+              (user, entry, emotion, confidence, datetime.now(), model_version, encode_probabilities(probs)))
     conn.commit()
+    entry_id = c.lastrowid
     conn.close()
+    return entry_id
 
 def get_entries(user):
     conn = get_connection()
     c = conn.cursor()
-    c.execute("SELECT * FROM journal_entries WHERE user=?", (user,))
+    c.execute("SELECT id, user, entry, emotion, confidence, timestamp FROM journal_entries WHERE user=?", (user,))
     rows = c.fetchall()
     conn.close()
     return rows
 
+def _probability_rows(rows):
+    """Split (id, timestamp, blob) rows into id/timestamp lists and an N x len(EMOTION_LABELS) array."""
+    ids = [row[0] for row in rows]
+    timestamps = [row[1] for row in rows]
+    if rows:
+        matrix = np.vstack([decode_probabilities(row[2]) for row in rows])
+    else:
+        matrix = np.empty((0, len(EMOTION_LABELS)), dtype=np.float32)
+    return ids, timestamps, matrix
+
+def get_entry_probabilities(user):
+    """
+    Stored probability vectors for a user's entries (entries saved before vectors were kept are skipped).
+    Returns (entry_ids, timestamps, matrix) with matrix columns in EMOTION_LABELS order.
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("""
+        SELECT id, timestamp, probs FROM journal_entries
+        WHERE user=? AND probs IS NOT NULL
+        ORDER BY timestamp
+    """, (user,))
+    rows = c.fetchall()
+    conn.close()
+    return _probability_rows(rows)
+
+def get_all_entry_probabilities():
+    """Stored probability vectors across all users, as (entry_ids, timestamps, matrix)."""
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("SELECT id, timestamp, probs FROM journal_entries WHERE probs IS NOT NULL ORDER BY timestamp")
+    rows = c.fetchall()
+    conn.close()
+    return _probability_rows(rows)
+
 def delete_entry(entry_id):
     conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
@@ -354,6 +442,9 @@ def delete_user_and_entries(user_email):
         c.execute("DELETE FROM preferences WHERE user = ?", (user_email,))
         # Delete checkins
         c.execute("DELETE FROM checkins WHERE user = ?", (user_email,))
+        # Delete word driver index
+        c.execute("DELETE FROM word_drivers WHERE user = ?", (user_email,))
+        c.execute("DELETE FROM word_driver_progress WHERE user = ?", (user_email,))
         conn.commit()
         return True
     except Exception:
@@ -393,4 +484,172 @@ def change_user_password(email, current_password, new_password):
     except Exception as e:
         return False, f"Error updating password: {str(e)}"
     finally:
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+# ------------------------
+# BULK RE-SCORING
+# ------------------------
+
+def get_job_connection():
+    """Connection for long-running batch jobs: WAL mode so the live app keeps reading while we write."""
+    conn = sqlite3.connect(DB_PATH, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    return conn
+
+def create_rescore_checkpoints_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS rescore_checkpoints (
+            job TEXT PRIMARY KEY,
+            last_id INTEGER,
+            rows_done INTEGER,
+            updated_at TIMESTAMP
+        )
+    """)
+    conn.commit()
+
+def get_rescore_checkpoint(conn, job):
+    """Return (last_id, rows_done) for a job, or (0, 0) if it has not started."""
+    c = conn.cursor()
+    c.execute("SELECT last_id, rows_done FROM rescore_checkpoints WHERE job=?", (job,))
+    row = c.fetchone()
+    return row if row else (0, 0)
+
+def reset_rescore_checkpoint(conn, job):
+    conn.execute("DELETE FROM rescore_checkpoints WHERE job=?", (job,))
+    conn.commit()
+
+def get_entries_after(conn, last_id, limit):
+    """Keyset-paginated (id, entry) rows with id > last_id."""
+    c = conn.cursor()
+    c.execute("SELECT id, entry FROM journal_entries WHERE id > ? ORDER BY id LIMIT ?", (last_id, limit))
+    return c.fetchall()
+
+def update_entry_emotions(conn, job, updates, last_id, rows_done):
+    """
+    Write (emotion, confidence, model_version, probs, id) updates and advance the job checkpoint in
+    one transaction, so an interrupted job resumes exactly after the last committed chunk.
+    """
+    c = conn.cursor()
+    try:
+        c.executemany("UPDATE journal_entries SET emotion=?, confidence=?, model_version=?, probs=? WHERE id=?", updates)
+        c.execute("INSERT OR REPLACE INTO rescore_checkpoints (job, last_id, rows_done, updated_at) VALUES (?, ?, ?, ?)",
+                  (job, last_id, rows_done, datetime.now()))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def get_stale_entries(conn, model_version, after, limit):
+    """
+    Oldest (id, entry, timestamp) rows after the (timestamp, id) cursor that were not scored by
+    model_version (or miss their probability vector). Walks the (timestamp, id) index, so each
+    call reads only from the cursor onward instead of rescanning and sorting the table.
+    """
+    c = conn.cursor()
+    c.execute("""
+        SELECT id, entry, timestamp FROM journal_entries
+        WHERE (timestamp, id) > (?, ?)
+          AND (model_version IS NULL OR model_version != ? OR probs IS NULL)
+        ORDER BY timestamp, id
+        LIMIT ?
+    """, (after[0], after[1], model_version, limit))
+    return c.fetchall()
+
+def count_stale_entries(conn, model_version):
+    c = conn.cursor()
+    c.execute("SELECT COUNT(*) FROM journal_entries WHERE model_version IS NULL OR model_version != ? OR probs IS NULL",
+              (model_version,))
+    return c.fetchone()[0]
+
+def update_stale_entries(conn, updates):
+    """Write (emotion, confidence, model_version, probs, id) updates in one transaction."""
+    c = conn.cursor()
+    try:
+        c.executemany("UPDATE journal_entries SET emotion=?, confidence=?, model_version=?, probs=? WHERE id=?", updates)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+# ------------------------
+# WORD DRIVER INDEX
+# ------------------------
+
+def get_word_driver_progress(conn, user):
+    """Return (last_id, entries_done) for a user's word driver index, or (0, 0) if never built."""
+    c = conn.cursor()
+    c.execute("SELECT last_id, entries_done FROM word_driver_progress WHERE user=?", (user,))
+    row = c.fetchone()
+    return row if row else (0, 0)
+
+def get_users_with_unindexed_entries(conn):
+    """Users with journal entries newer than their word driver progress."""
+    c = conn.cursor()
+    c.execute("""
+        SELECT DISTINCT e.user FROM journal_entries e
+        LEFT JOIN word_driver_progress p ON p.user = e.user
+        WHERE e.id > COALESCE(p.last_id, 0)
+    """)
+    return [row[0] for row in c.fetchall()]
+
+def get_user_entries_after(conn, user, last_id, limit):
+    """Keyset-paginated (id, entry) rows of one user with id > last_id."""
+    c = conn.cursor()
+    c.execute("SELECT id, entry FROM journal_entries WHERE user=? AND id > ? ORDER BY id LIMIT ?",
+              (user, last_id, limit))
+    return c.fetchall()
+
+def add_word_drivers(conn, user, rows, expected_last_id, last_id, entries_done):
+    """
+    Add (word, emotion, impact, entries) increments to a user's index and advance its progress in one
+    transaction. Returns False without writing if another job advanced the progress first.
+    """
+    c = conn.cursor()
+    try:
+        c.execute("BEGIN IMMEDIATE")
+        if get_word_driver_progress(conn, user)[0] != expected_last_id:
+            conn.rollback()
+            return False
+        c.executemany("""
+            INSERT INTO word_drivers (user, word, emotion, impact, entries) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(user, word, emotion) DO UPDATE SET
+                impact = impact + excluded.impact,
+                entries = entries + excluded.entries
+        """, [(user, word, emotion, impact, entries) for word, emotion, impact, entries in rows])
+        c.execute("INSERT OR REPLACE INTO word_driver_progress (user, last_id, entries_done, updated_at) VALUES (?, ?, ?, ?)",
+                  (user, last_id, entries_done, datetime.now()))
+        conn.commit()
+        return True
+    except Exception:
+        conn.rollback()
+        raise
+
+def reset_word_drivers(conn, user):
+    conn.execute("DELETE FROM word_drivers WHERE user=?", (user,))
+    conn.execute("DELETE FROM word_driver_progress WHERE user=?", (user,))
+    conn.commit()
+
+def get_word_drivers(user, emotion, limit=15):
+    """Top (word, impact, entries) rows pushing a user's entries toward emotion, strongest first."""
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("""
+        SELECT word, impact, entries FROM word_drivers
+        WHERE user=? AND emotion=? AND impact > 0
+        ORDER BY impact DESC
+        LIMIT ?
+    """, (user, emotion, limit))
+    rows = c.fetchall()
+    conn.close()
+    return rows
+
+def get_word_driver_coverage(user):
+    """Return (indexed, total) journal entry counts for a user's word driver index."""
+    conn = get_connection()
+    c = conn.cursor()
+    _, entries_done = get_word_driver_progress(conn, user)
+    c.execute("SELECT COUNT(*) FROM journal_entries WHERE user=?", (user,))
+    total = c.fetchone()[0]
+    conn.close()
+    return entries_done, total
@@ -0,0 +1,177 @@
+# utils/explanation_cache.py
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+from model.emotion_classifier import current_cache_namespace
+from model.prediction_cache import text_key
+from utils.attribution import Attribution
+from utils.explanation_pool import explanation_pool, EXPLANATION_PROCESSES
+from utils.gradient_attribution import gradient_attribution
+from utils.db import DB_PATH
+from utils.shap_explainer import explain_text, SHAP_MODE
+
+# In-memory entries (text, label) kept on top of the SQLite store
+EXPLANATION_CACHE_SIZE = int(os.getenv("EXPLANATION_CACHE_SIZE", 256))
+EXPLANATION_CACHE_DB = os.getenv("EXPLANATION_CACHE_DB", DB_PATH)
+
+
+class ExplanationCache:
+    """
+    Per-label SHAP attributions keyed by normalized text hash and model revision.
+    Token strings are stored once per text; each label's attributions are a float32 blob.
+    """
+
+    def __init__(self, max_size=EXPLANATION_CACHE_SIZE, db_path=EXPLANATION_CACHE_DB):
+        self.max_size = max_size
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._table_ready = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        if not self._table_ready:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS explanation_tokens (
+                    key TEXT PRIMARY KEY,
+                    tokens TEXT,
+                    created_at TIMESTAMP
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS explanation_values (
+                    key TEXT,
+                    label TEXT,
+                    attributions BLOB,
+                    base_value REAL,
+                    mode TEXT,
+                    max_evals INTEGER,
+                    coverage REAL,
+                    PRIMARY KEY (key, label)
+                )
+            """)
+            conn.commit()
+            self._table_ready = True
+        return conn
+
+    def _remember(self, cache_key, item):
+        self._entries[cache_key] = item
+        self._entries.move_to_end(cache_key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def get(self, key, label):
+        """Return (tokens, attributions, base_value, budget) for one label, or None."""
+        cache_key = (key, label)
+        with self._lock:
+            if cache_key in self._entries:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return self._entries[cache_key]
+
+        conn = self._connect()
+        c = conn.cursor()
+        c.execute("""
+            SELECT t.tokens, v.attributions, v.base_value, v.mode, v.max_evals, v.coverage
+            FROM explanation_values v JOIN explanation_tokens t ON t.key = v.key
+            WHERE v.key=? AND v.label=?
+        """, (key, label))
+        row = c.fetchone()
+        conn.close()
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            tokens, blob, base_value, mode, max_evals, coverage = row
+            item = (json.loads(tokens), np.frombuffer(blob, dtype=np.float32), base_value,
+                    {"mode": mode, "max_evals": max_evals, "coverage": coverage})
+            self._remember(cache_key, item)
+            return item
+
+    def put(self, key, attribution):
+        """Store every label of an Attribution."""
+        items = []
+        for i, label in enumerate(attribution.labels):
+            base = None if attribution.base_values is None else float(np.ravel(attribution.base_values)[i])
+            items.append((label, attribution.values[:, i].astype(np.float32), base))
+
+        with self._lock:
+            for label, values, base in items:
+                self._remember((key, label), (attribution.tokens, values, base, attribution.budget))
+
+        budget = attribution.budget
+        conn = self._connect()
+        c = conn.cursor()
+        c.execute("INSERT OR REPLACE INTO explanation_tokens (key, tokens, created_at) VALUES (?, ?, ?)",
+                  (key, json.dumps(attribution.tokens), datetime.now()))
+        c.executemany("""
+            INSERT OR REPLACE INTO explanation_values
+            (key, label, attributions, base_value, mode, max_evals, coverage) VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [(key, label, values.tobytes(), base, budget.get("mode"), budget.get("max_evals"), budget.get("coverage"))
+              for label, values, base in items])
+        conn.commit()
+        conn.close()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0, "size": len(self._entries)}
+
+
+# Shared instance
+explanation_cache = ExplanationCache()
+
+
+def explanation_key(text, engine="shap"):
+    namespace = current_cache_namespace()
+    return text_key(text, namespace if engine == "shap" else f"{namespace}/{engine}")
+
+
+def get_cached_explanation(text, labels, engine="shap", mode=None):
+    """
+    Attribution for labels from the cache only (never computes), or None if any label is missing.
+    With mode="exact", SHAP entries computed under an evaluation budget don't count.
+    """
+    key = explanation_key(text, engine)
+    found = [explanation_cache.get(key, label.lower()) for label in labels]
+    if any(item is None for item in found):
+        return None
+    if engine == "shap" and mode == "exact" and any(item[3].get("mode") != "exact" for item in found):
+        return None
+    tokens = found[0][0]
+    values = np.stack([item[1] for item in found], axis=1)
+    base = [item[2] for item in found]
+    return Attribution(tokens, labels, values, None if None in base else base, found[0][3], cached=True)
+
+
+def explain_cached(text, labels, encoding=None, mode=SHAP_MODE, engine="shap", **kwargs):
+    """
+    Attribution for the given labels, served from the cache when available and otherwise
+    computed and stored. engine is "shap" (Partition SHAP) or "fast" (gradient attribution).
+    Exact SHAP requests are not served by budgeted entries.
+    """
+    cached = get_cached_explanation(text, labels, engine, mode)
+    if cached is not None:
+        return cached
+
+    if engine == "fast":
+        attribution = gradient_attribution(text, labels, encoding=encoding, **kwargs)
+    elif engine == "shap" and EXPLANATION_PROCESSES > 0:
+        # Worker processes re-tokenize; the encoding is cheaper to rebuild than to pickle
+        attribution = explanation_pool.explain(text, labels, mode=mode, **kwargs)
+    elif engine == "shap":
+        attribution = Attribution.from_shap(explain_text(text, encoding=encoding, mode=mode, labels=labels, **kwargs))
+    else:
+        raise ValueError(f"Unknown attribution engine: {engine}")
+    explanation_cache.put(explanation_key(text, engine), attribution)
+    return attribution
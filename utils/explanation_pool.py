@@ -0,0 +1,227 @@
+# utils/explanation_pool.py
+"""
+Process-pool SHAP service.
+
+The Partition explainer spends much of its time in GIL-bound Python, so
+explanations running on threads share one core. Each worker process here
+loads its own model copy and explainer, takes jobs from a bounded queue and
+sends back compact (tokens, float32 values) results.
+
+Enabled by setting EXPLANATION_PROCESSES > 0; explain_cached then routes
+SHAP explanations through the shared pool.
+"""
+
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FuturesTimeout
+
+from utils.attribution import Attribution
+
+# Worker processes (0 = explain on threads in the app process)
+EXPLANATION_PROCESSES = int(os.getenv("EXPLANATION_PROCESSES", 0))
+# Torch/OpenMP threads per worker; processes x threads should not exceed the host's cores
+EXPLANATION_PROCESS_THREADS = int(os.getenv("EXPLANATION_PROCESS_THREADS", 1))
+# Jobs allowed to wait for a worker before submit blocks, then fails after EXPLANATION_QUEUE_TIMEOUT seconds
+EXPLANATION_QUEUE_SIZE = int(os.getenv("EXPLANATION_QUEUE_SIZE", 2 * max(EXPLANATION_PROCESSES, 1)))
+EXPLANATION_QUEUE_TIMEOUT = float(os.getenv("EXPLANATION_QUEUE_TIMEOUT", 5.0))
+# "spawn" or "forkserver": workers must not inherit the app's threads or OpenMP state
+EXPLANATION_START_METHOD = os.getenv("EXPLANATION_START_METHOD", "spawn")
+# Seconds explain() waits for a result before giving up on it
+EXPLANATION_RESULT_TIMEOUT = float(os.getenv("EXPLANATION_RESULT_TIMEOUT", 120.0))
+# Workers dying before taking any job this many times in a row (e.g. the model can't load) shut the pool down
+EXPLANATION_MAX_STARTUP_FAILURES = int(os.getenv("EXPLANATION_MAX_STARTUP_FAILURES", 3))
+
+
+def _worker_main(jobs, results, threads):
+    """Worker loop: load the model once, then explain jobs until a None sentinel arrives."""
+    # Set before torch is imported so its thread pools are created at this size
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    os.environ["EMOTION_WARMUP"] = "0"
+
+    import torch
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+
+    from utils.shap_explainer import explain_text, warmup
+    warmup()
+
+    pid = os.getpid()
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        job_id, text, labels, kwargs = job
+        results.put((job_id, "started", pid))
+        try:
+            attribution = Attribution.from_shap(explain_text(text, labels=labels, **kwargs))
+            results.put((job_id, "done", (attribution.tokens, attribution.labels, attribution.values,
+                                          attribution.base_values, attribution.budget)))
+        except Exception as e:
+            results.put((job_id, "error", f"{type(e).__name__}: {e}"))
+
+
+class ExplanationPool:
+    """
+    Fixed set of explanation processes fed by a bounded job queue.
+    Workers start on the first submit; a worker that dies is replaced and its job fails.
+    If workers keep dying before taking a job, the pool stops respawning them and fails
+    pending and new jobs instead of leaving them queued forever.
+    """
+
+    def __init__(self, processes=EXPLANATION_PROCESSES, threads=EXPLANATION_PROCESS_THREADS,
+                 queue_size=EXPLANATION_QUEUE_SIZE, start_method=EXPLANATION_START_METHOD):
+        self.processes = processes
+        self.threads = threads
+        self.queue_size = queue_size
+        self._context = multiprocessing.get_context(start_method)
+        self._ids = itertools.count()
+        self._futures = {}
+        self._running = {}
+        self._workers = []
+        self._served = set()
+        self._startup_failures = 0
+        self._broken = None
+        self._lock = threading.Lock()
+        self._started = False
+
+    def _start_worker(self):
+        worker = self._context.Process(target=_worker_main, args=(self._jobs, self._results, self.threads),
+                                       name="explanation-process", daemon=True)
+        worker.start()
+        return worker
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._started:
+                return
+            self._jobs = self._context.Queue(maxsize=self.queue_size)
+            self._results = self._context.Queue()
+            self._workers = [self._start_worker() for _ in range(self.processes)]
+            threading.Thread(target=self._collect, name="explanation-results", daemon=True).start()
+            self._started = True
+
+    def _collect(self):
+        """Resolve futures from worker results and replace workers that died."""
+        last_reap = time.monotonic()
+        while True:
+            # Checked on a timer rather than only when idle, so dead workers are replaced under load too
+            if time.monotonic() - last_reap >= 1.0:
+                self._reap()
+                last_reap = time.monotonic()
+            try:
+                self._handle(*self._results.get(timeout=1.0))
+            except queue.Empty:
+                continue
+
+    def _handle(self, job_id, status, payload):
+        with self._lock:
+            if status == "started":
+                self._served.add(payload)
+                self._startup_failures = 0
+                if payload in self._alive_pids():
+                    self._running[payload] = job_id
+                    return
+                # The worker was reaped before this message arrived, so its job is lost
+                future = self._futures.pop(job_id, None)
+                if future is not None:
+                    future.set_exception(RuntimeError("Explanation process exited while running this job"))
+                return
+            self._running = {pid: running for pid, running in self._running.items() if running != job_id}
+            future = self._futures.pop(job_id, None)
+        if future is None:
+            return
+        if status == "done":
+            tokens, labels, values, base_values, budget = payload
+            future.set_result(Attribution(tokens, labels, values, base_values, budget))
+        else:
+            future.set_exception(RuntimeError(payload))
+
+    def _alive_pids(self):
+        return {worker.pid for worker in self._workers if worker.is_alive()}
+
+    def _reap(self):
+        with self._lock:
+            if self._broken:
+                return
+            for i, worker in enumerate(self._workers):
+                if worker.is_alive():
+                    continue
+                if worker.pid not in self._served:
+                    self._startup_failures += 1
+                self._served.discard(worker.pid)
+                if self._startup_failures >= EXPLANATION_MAX_STARTUP_FAILURES:
+                    self._shut_down_broken(f"Explanation processes keep exiting on startup (last exit code "
+                                           f"{worker.exitcode}); check that the model loads")
+                    return
+                self._workers[i] = self._start_worker()
+
+            # Fail jobs held by pids that are gone (including ones whose worker was just replaced)
+            alive = self._alive_pids()
+            for pid in [pid for pid in self._running if pid not in alive]:
+                future = self._futures.pop(self._running.pop(pid), None)
+                if future is not None:
+                    future.set_exception(RuntimeError("Explanation process exited while running this job"))
+
+    def _shut_down_broken(self, reason):
+        """Stop respawning and fail every pending job (called with the lock held)."""
+        self._broken = reason
+        self._running.clear()
+        futures, self._futures = self._futures, {}
+        for future in futures.values():
+            future.set_exception(RuntimeError(reason))
+
+    def submit(self, text, labels, timeout=EXPLANATION_QUEUE_TIMEOUT, **kwargs):
+        """
+        Queue an explanation (kwargs go to explain_text) and return a Future of its Attribution.
+        Blocks while the queue is full and raises RuntimeError if no slot frees up within timeout.
+        """
+        self._ensure_started()
+        job_id = next(self._ids)
+        future = Future()
+        with self._lock:
+            if self._broken:
+                raise RuntimeError(self._broken)
+            self._futures[job_id] = future
+        try:
+            self._jobs.put((job_id, text, list(labels), kwargs), timeout=timeout)
+        except queue.Full:
+            with self._lock:
+                self._futures.pop(job_id, None)
+            raise RuntimeError("Explanation service is busy, please try again shortly") from None
+        return future
+
+    def explain(self, text, labels, timeout=EXPLANATION_RESULT_TIMEOUT, **kwargs):
+        """Blocking submit(...).result(), raising RuntimeError if no result arrives within timeout seconds."""
+        future = self.submit(text, labels, **kwargs)
+        try:
+            return future.result(timeout=timeout)
+        except FuturesTimeout:
+            raise RuntimeError(f"Explanation did not finish within {timeout:.0f}s") from None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "processes": self.processes,
+                "threads_per_process": self.threads,
+                "alive": sum(worker.is_alive() for worker in self._workers),
+                "broken": self._broken,
+                "pending": len(self._futures),
+                "running": len(self._running),
+            }
+
+    def shutdown(self):
+        if not self._started:
+            return
+        for _ in self._workers:
+            self._jobs.put(None)
+        for worker in self._workers:
+            worker.join(timeout=10)
+
+
+# Shared pool (workers are only started if EXPLANATION_PROCESSES > 0 and something is submitted)
+explanation_pool = ExplanationPool()
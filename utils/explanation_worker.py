@@ -0,0 +1,19 @@
+# utils/explanation_worker.py
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.explanation_cache import explain_cached
+from utils.explanation_pool import EXPLANATION_PROCESSES
+from utils.shap_explainer import SHAP_MODE
+
+# Background explanation threads shared by all sessions
+EXPLANATION_WORKERS = int(os.getenv("EXPLANATION_WORKERS", 2))
+
+# With a process pool these threads only wait on it, so keep one per worker process
+_pool = ThreadPoolExecutor(max_workers=max(EXPLANATION_WORKERS, EXPLANATION_PROCESSES),
+                           thread_name_prefix="explanation-worker")
+
+
+def submit_explanation(text, labels, encoding=None, mode=SHAP_MODE, engine="shap"):
+    """Start a (cached) explanation in the background and return a Future of its Attribution."""
+    return _pool.submit(explain_cached, text, labels, encoding=encoding, mode=mode, engine=engine)
@@ -0,0 +1,81 @@
+# utils/inference_queue.py
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from model.emotion_classifier import get_model
+
+# Batching window configuration (override via environment variables)
+BATCH_WINDOW_MS = float(os.getenv("INFERENCE_BATCH_WINDOW_MS", 10))
+MAX_BATCH_SIZE = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", 32))
+
+
+class InferenceQueue:
+    """
+    Collects predict requests from every Streamlit session and runs them
+    through the shared model as one batched forward pass per window.
+    """
+
+    def __init__(self, get_classifier, window_ms=BATCH_WINDOW_MS, max_batch_size=MAX_BATCH_SIZE):
+        self.get_classifier = get_classifier
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self._requests = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="inference-queue", daemon=True)
+        self._worker.start()
+
+    def submit(self, text, input_ids=None):
+        """
+        Queue a text for classification and return a Future of (ranked emotions, logits, model_version),
+        where model_version names the stage that answered.
+        Pass input_ids to reuse a tokenization the caller already has.
+        """
+        future = Future()
+        self._requests.put((text, input_ids, future))
+        return future
+
+    def predict_emotion(self, text, input_ids=None):
+        """Blocking drop-in replacement for EmotionClassifier.predict_emotion."""
+        return self.submit(text, input_ids=input_ids).result()
+
+    def _collect(self):
+        # Block for the first request, then gather more until the window closes or the batch is full
+        batch = [self._requests.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            batch = [request for request in batch if request[2].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            texts = [text for text, _, _ in batch]
+            try:
+                classifier = self.get_classifier()
+                input_ids = None
+                if any(ids is not None for _, ids, _ in batch):
+                    # Tokenize only the requests that did not bring their own input_ids
+                    input_ids = [classifier.tokenizer(text)["input_ids"] if ids is None else ids
+                                 for text, ids, _ in batch]
+                results = classifier.predict_emotions(texts, batch_size=self.max_batch_size, input_ids=input_ids)
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, _, future), result in zip(batch, results):
+                future.set_result(result)
+
+
+# Export singleton instance shared by all sessions in this process (the model loads on the first batch)
+inference_queue = InferenceQueue(get_model)
@@ -0,0 +1,172 @@
+# utils/rescore.py
+"""
+Re-classification of journal_entries with the current model.
+
+Full mode streams every entry in keyset-paginated chunks, classifies them in
+batches and writes each chunk back in its own transaction together with a
+checkpoint, so the job can be interrupted and resumed at any point.
+
+Stale mode only re-scores entries stamped with an older model_version,
+oldest first, and sleeps between batches to stay within a CPU budget.
+
+Usage:
+    python -m utils.rescore --chunk-size 1000 --batch-size 64
+    python -m utils.rescore --stale --cpu-budget 0.25 --follow
+"""
+
+import argparse
+import time
+
+import torch
+
+from model.emotion_classifier import get_model
+from utils.db import (
+    init_db,
+    encode_probabilities,
+    get_job_connection,
+    get_stale_entries,
+    count_stale_entries,
+    update_stale_entries,
+    create_rescore_checkpoints_table,
+    get_rescore_checkpoint,
+    reset_rescore_checkpoint,
+    get_entries_after,
+    update_entry_emotions,
+)
+
+
+def score_row(classifier, entry_id, ranked):
+    """(emotion, confidence, model_version, probs, id) update tuple for one classified entry."""
+    label, confidence = ranked[0]
+    return label, confidence, classifier.model_version, encode_probabilities(ranked), entry_id
+
+
+def score_rows(classifier, rows, batch_size):
+    """
+    Update tuples for (id, entry) rows, scored the way the app scores them: entries longer than
+    the model's window are classified window by window, the rest in length-sorted batches.
+    """
+    texts = [entry or "" for _, entry in rows]
+    input_ids = classifier.tokenizer(texts)["input_ids"]
+    long_rows = {i for i, ids in enumerate(input_ids) if classifier.is_long(texts[i], input_ids=ids)}
+    short_rows = [i for i in range(len(rows)) if i not in long_rows]
+
+    ranked = {}
+    if short_rows:
+        # Stored results always come from the full model, never the cascade's first stage
+        results = classifier.predict_emotions([texts[i] for i in short_rows], batch_size=batch_size,
+                                              input_ids=[input_ids[i] for i in short_rows], use_cascade=False)
+        for i, (emotions, _, _) in zip(short_rows, results):
+            ranked[i] = emotions
+    for i in sorted(long_rows):
+        ranked[i], _ = classifier.predict_long_emotion(texts[i])
+    return [score_row(classifier, entry_id, ranked[i]) for i, (entry_id, _) in enumerate(rows)]
+
+
+def rescore_entries(job=None, chunk_size=1000, batch_size=64, restart=False, limit=None, log=print):
+    """Re-classify every journal entry after the job's checkpoint. Returns the number of rows written."""
+    classifier = get_model()
+    job = job or classifier.model_version
+
+    init_db()
+    conn = get_job_connection()
+    create_rescore_checkpoints_table(conn)
+    if restart:
+        reset_rescore_checkpoint(conn, job)
+    last_id, rows_done = get_rescore_checkpoint(conn, job)
+    if rows_done:
+        log(f"Resuming job '{job}' after id {last_id} ({rows_done} rows already done)")
+
+    started = time.monotonic()
+    written = 0
+    try:
+        while limit is None or written < limit:
+            size = chunk_size if limit is None else min(chunk_size, limit - written)
+            rows = get_entries_after(conn, last_id, size)
+            if not rows:
+                break
+
+            updates = score_rows(classifier, rows, batch_size)
+
+            last_id = rows[-1][0]
+            rows_done += len(rows)
+            written += len(rows)
+            update_entry_emotions(conn, job, updates, last_id, rows_done)
+
+            elapsed = time.monotonic() - started
+            log(f"{rows_done} rows done (last id {last_id}) – {written / elapsed:.1f} rows/s")
+    finally:
+        conn.close()
+    return written
+
+
+def rescore_stale(cpu_budget=0.25, batch_size=32, follow=False, poll_seconds=60, log=print):
+    """
+    Re-score only entries produced by an older model, oldest first.
+    After each batch the job sleeps so that busy time stays at cpu_budget (0-1] of wall time.
+    With follow=True it keeps polling for newly stale entries instead of exiting.
+    Entries are walked once in (timestamp, id) order, so each batch resumes from the previous one.
+    """
+    if not 0 < cpu_budget <= 1:
+        raise ValueError("cpu_budget must be in (0, 1]")
+    classifier = get_model()
+
+    init_db()
+    conn = get_job_connection()
+    log(f"{count_stale_entries(conn, classifier.model_version)} entries not scored by {classifier.model_version}")
+
+    written = 0
+    cursor = ("", 0)
+    try:
+        while True:
+            rows = get_stale_entries(conn, classifier.model_version, cursor, batch_size)
+            if not rows:
+                if not follow:
+                    break
+                time.sleep(poll_seconds)
+                continue
+
+            busy_started = time.monotonic()
+            cursor = (rows[-1][2], rows[-1][0])
+            update_stale_entries(conn, score_rows(classifier, [(entry_id, entry) for entry_id, entry, _ in rows],
+                                                  batch_size))
+            busy = time.monotonic() - busy_started
+            written += len(rows)
+            log(f"{written} stale entries re-scored ({len(rows) / busy:.1f} rows/s while busy)")
+
+            time.sleep(busy * (1 - cpu_budget) / cpu_budget)
+    finally:
+        conn.close()
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-classify historical journal entries with the current model.")
+    parser.add_argument("--stale", action="store_true",
+                        help="Only re-score entries stamped with an older model version")
+    parser.add_argument("--cpu-budget", type=float, default=0.25,
+                        help="Stale mode: fraction of wall time spent computing (0-1]")
+    parser.add_argument("--threads", type=int, default=None, help="Torch threads to use")
+    parser.add_argument("--follow", action="store_true", help="Stale mode: keep polling for new stale entries")
+    parser.add_argument("--job", default=None, help="Checkpoint name (default: current model version)")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Rows read and committed per transaction")
+    parser.add_argument("--batch-size", type=int, default=64, help="Texts per forward pass")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after this many rows")
+    parser.add_argument("--restart", action="store_true", help="Ignore any saved checkpoint for this job")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    started = time.monotonic()
+    if args.stale:
+        written = rescore_stale(args.cpu_budget, args.batch_size, args.follow)
+    else:
+        written = rescore_entries(args.job, args.chunk_size, args.batch_size, args.restart, args.limit)
+    elapsed = time.monotonic() - started
+    rate = written / elapsed if elapsed else 0.0
+    print(f"✅ Re-scored {written} entries in {elapsed:.1f}s ({rate:.1f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
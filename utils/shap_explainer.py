@@ -1,35 +1,160 @@
 # utils/shap_explainer.py
 
+import os
+import threading
+import time
+
 import shap
-import torch
-from model.emotion_classifier import model_loader
-from transformers import AutoTokenizer
+from model.emotion_classifier import get_model
+
+# Warm the model and explainer in the background when the app starts
+EMOTION_WARMUP = os.getenv("EMOTION_WARMUP", "1") == "1"
+
+# Evaluation budget: "budget" picks max_evals from token count and a latency target, "exact" expands the full partition tree
+SHAP_MODE = os.getenv("SHAP_MODE", "budget")
+SHAP_TARGET_LATENCY = float(os.getenv("SHAP_TARGET_LATENCY", 2.0))
+SHAP_MIN_EVALS = int(os.getenv("SHAP_MIN_EVALS", 50))
 
-# Load model and tokenizer
-model = model_loader.model
-tokenizer = model_loader.tokenizer
-id2label = model_loader.id2label  # <-- Get label mapping from model
+# Memory bound for the masked variants SHAP hands predict_prob in one call
+SHAP_BATCH_SIZE = int(os.getenv("SHAP_BATCH_SIZE", 64))
+SHAP_BATCH_TOKENS = int(os.getenv("SHAP_BATCH_TOKENS", 8192))
 
-# Ensure model is in evaluation mode
-model.eval()
+# Running estimate of seconds per masked sample, updated from every predict_prob call
+_eval_cost = 0.005
 
-# Predict function used by SHAP
+# Output columns requested by the explanation running on this thread (None = all emotions)
+_outputs = threading.local()
+
+# Predict function used by SHAP (runs on the configured torch/onnx backend)
 def predict_prob(texts):
+    global _eval_cost
     texts = [str(t) for t in texts]
-    inputs = tokenizer(texts, padding=True, truncation=True, return_tensors="pt")
-    with torch.no_grad():
-        outputs = model(**inputs)
-        probs = torch.nn.functional.softmax(outputs.logits, dim=1)
-    return probs.numpy()
+    started = time.perf_counter()
+    # Deduplicated, length-sorted, memory-bounded mini-batches instead of one tensor padded to the longest variant
+    probs = get_model().predict_proba(texts, batch_size=SHAP_BATCH_SIZE, max_batch_tokens=SHAP_BATCH_TOKENS)
+    if texts:
+        _eval_cost = 0.8 * _eval_cost + 0.2 * (time.perf_counter() - started) / len(texts)
+    columns = getattr(_outputs, "columns", None)
+    return probs if columns is None else probs[:, columns]
+
+def full_evals(n_tokens):
+    """Model evaluations needed to expand every node of the Partition explainer's binary tree."""
+    return 2 + 4 * max(n_tokens - 1, 0)
+
+def choose_max_evals(n_tokens, mode=SHAP_MODE, target_latency=SHAP_TARGET_LATENCY):
+    """Evaluation budget for a text of n_tokens under the given mode."""
+    full = full_evals(n_tokens)
+    if mode == "exact":
+        return full
+    if mode != "budget":
+        raise ValueError(f"Unknown SHAP mode: {mode}")
+    affordable = int(target_latency / max(_eval_cost, 1e-6))
+    return min(full, max(SHAP_MIN_EVALS, affordable))
+
+class EncodingReuseTokenizer:
+    """
+    Tokenizer proxy for SHAP's Text masker. While a text is being explained it
+    serves that text's pre-computed encoding instead of tokenizing it again.
+    """
+
+    def __init__(self, tokenizer):
+        self._tokenizer = tokenizer
+        self._local = threading.local()
+
+    def use_encoding(self, text, encoding):
+        self._local.current = (text, encoding) if encoding is not None else None
+
+    def __call__(self, text, *args, **kwargs):
+        current = getattr(self._local, "current", None)
+        if current is not None and text == current[0] and not args and kwargs.get("return_offsets_mapping"):
+            return current[1]
+        return self._tokenizer(text, *args, **kwargs)
 
-# Initialize SHAP explainer
-explainer = shap.Explainer(predict_prob, tokenizer)
+    def __getattr__(self, name):
+        if name.startswith("__") or name in ("_tokenizer", "_local"):
+            raise AttributeError(name)
+        return getattr(self._tokenizer, name)
+
+# SHAP explainers, one per thread: the Partition explainer and Text masker keep per-text state
+# (clustering, mask matrix, cached segments) on the instance, so concurrent explanations can't share one
+_explainers = threading.local()
+
+def get_explainer():
+    """Return this thread's SHAP explainer, building it on first call."""
+    explainer = getattr(_explainers, "explainer", None)
+    if explainer is None:
+        tokenizer = EncodingReuseTokenizer(get_model().tokenizer)
+        explainer = shap.Explainer(predict_prob, shap.maskers.Text(tokenizer))
+        _explainers.explainer, _explainers.tokenizer = explainer, tokenizer
+    return explainer
 
 # Function to get SHAP explanation with proper output names
-def explain_text(text):
-    shap_values = explainer([text])
-    
+def explain_text(text, encoding=None, mode=SHAP_MODE, target_latency=SHAP_TARGET_LATENCY, max_evals=None,
+                 labels=None):
+    """
+    Explain text with SHAP. Pass the text's offset-mapped encoding (e.g. Analysis.encoding)
+    to skip re-tokenizing it inside the masker. Pass labels (e.g. ["joy"]) to attribute only
+    those emotions; output_names then lists just those labels, in the order given.
+
+    The evaluation count comes from max_evals if given, otherwise from the token count and
+    mode ("budget" aims for target_latency seconds, "exact" expands the full tree).
+    The result's .budget dict reports the evaluations used and the fraction of the tree covered.
+    """
+    model = get_model()
+    id2label = model.id2label
+    explainer = get_explainer()
+    if encoding is None:
+        encoding = model.tokenizer(text, return_offsets_mapping=True)
+    n_tokens = len(encoding["input_ids"])
+    if max_evals is None:
+        max_evals = choose_max_evals(n_tokens, mode, target_latency)
+
+    output_names = [id2label[i].lower() for i in range(len(id2label))]
+    columns = None
+    if labels is not None:
+        columns = [output_names.index(label.lower()) for label in labels]
+        output_names = [output_names[i] for i in columns]
+
+    started = time.perf_counter()
+    _explainers.tokenizer.use_encoding(text, encoding)
+    _outputs.columns = columns
+    try:
+        shap_values = explainer([text], max_evals=max_evals)
+    finally:
+        _explainers.tokenizer.use_encoding(text, None)
+        _outputs.columns = None
+
     # Assign correct emotion labels to SHAP outputs
-    shap_values.output_names = [id2label[i].lower() for i in range(len(id2label))]
-    
+    shap_values.output_names = output_names
+
+    full = full_evals(n_tokens)
+    shap_values.budget = {
+        "mode": mode,
+        "tokens": n_tokens,
+        "max_evals": max_evals,
+        "full_evals": full,
+        "coverage": min(1.0, max_evals / full),
+        "seconds": time.perf_counter() - started,
+    }
     return shap_values
+
+_warmup_started = False
+_warmup_lock = threading.Lock()
+
+def warmup():
+    """Load the model and explainer, then run a dummy prediction and explanation."""
+    global _warmup_started
+    _warmup_started = True
+    get_model().warmup()
+    explain_text("Warming up the explainer.")
+
+def start_background_warmup():
+    """Run warmup() once per process on a daemon thread."""
+    global _warmup_started
+    if not EMOTION_WARMUP:
+        return
+    with _warmup_lock:
+        if _warmup_started:
+            return
+        _warmup_started = True
+    threading.Thread(target=warmup, name="model-warmup", daemon=True).start()
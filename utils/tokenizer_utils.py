@@ -1,20 +1,56 @@
-def clean_bert_tokens(tokens):
+import numpy as np
+
+_APOSTROPHES = ("'", "’")
+
+def top_word_scores(words, scores, stop_words, limit=8):
     """
-    Cleans WordPiece tokens to reconstruct human-readable words.
+    Pair words with their attribution scores and keep the most influential ones.
+    Returns (word, abs(score), score) tuples sorted by absolute impact.
     """
-    words = []
-    current_word = ""
-    for token in tokens:
-        if token in ["[CLS]", "[SEP]", "[PAD]"]:
-            continue
-        if token.startswith("##"):
-            current_word += token[2:]
-        elif token in ["'", "’"] and current_word:
-            current_word += token
-        else:
-            if current_word:
-                words.append(current_word)
-            current_word = token
-    if current_word:
-        words.append(current_word)
-    return [w for w in words if w.strip()]
+    word_scores = []
+    for word, score in zip(words, scores):
+        lowered = word.lower()
+        if lowered not in stop_words and lowered.isalpha() and len(lowered) > 2:
+            word_scores.append((word, abs(score), score))
+    word_scores.sort(key=lambda x: x[1], reverse=True)
+    return word_scores[:limit]
+
+def word_attributions(encoding, text, values):
+    """
+    Sum per-token attributions into whole words in one vectorized pass.
+
+    encoding is the fast tokenizer's offset-mapped encoding of text, and values has one row
+    per encoding token (special tokens included), shaped (tokens,) or (tokens, labels).
+    Sub-word pieces are grouped by word_ids(), and contractions the pre-tokenizer splits
+    (don ' t) are joined back. Returns (words, word_values) with one row per word.
+    """
+    values = np.asarray(values, dtype=np.float32)
+    word_ids = np.array([-1 if w is None else w for w in encoding.word_ids()])
+    if len(values) != len(word_ids):
+        raise ValueError(f"Got {len(values)} attribution rows for an encoding of {len(word_ids)} tokens")
+
+    keep = word_ids >= 0
+    if not keep.any():
+        return [], values[:0]
+    ids = word_ids[keep]
+    offsets = np.asarray(encoding["offset_mapping"])[keep]
+
+    # word_ids never decrease, so every word is a contiguous run of tokens
+    new_word = np.r_[True, ids[1:] != ids[:-1]]
+    word_starts = np.flatnonzero(new_word)
+    starts = offsets[word_starts, 0]
+    ends = np.maximum.reduceat(offsets[:, 1], word_starts)
+
+    # Attach apostrophes and the pieces after them to the adjacent word
+    apostrophe = np.array([text[s:e] in _APOSTROPHES for s, e in zip(starts, ends)])
+    attached = np.r_[False, (starts[1:] == ends[:-1]) & (apostrophe[1:] | apostrophe[:-1])]
+    group = np.cumsum(~attached) - 1
+    token_group = group[np.cumsum(new_word) - 1]
+
+    sums = np.zeros((group[-1] + 1,) + values.shape[1:], dtype=np.float32)
+    np.add.at(sums, token_group, values[keep])
+
+    first = np.flatnonzero(~attached)
+    last = np.r_[first[1:], len(starts)] - 1
+    words = [text[s:e] for s, e in zip(starts[first], ends[last])]
+    return words, sums
@@ -0,0 +1,163 @@
+# utils/word_drivers.py
+"""
+"Explain my history": a per-user index of the words that drive each emotion.
+
+Entries are explained for every emotion in keyset-paginated batches, their
+token attributions are summed into words, and each batch adds its
+(word, emotion) -> impact and entry-count increments to the word_drivers
+table together with the user's progress, in one transaction. Runs are
+incremental: only entries newer than the user's progress are explained.
+Deleted entries keep contributing until the user's index is rebuilt.
+
+Usage:
+    python -m utils.word_drivers                      # every user with new entries
+    python -m utils.word_drivers --user me@example.com --rebuild
+    python -m utils.word_drivers --follow --cpu-budget 0.25
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from model.emotion_classifier import get_model
+from utils.db import (
+    init_db,
+    EMOTION_LABELS,
+    get_job_connection,
+    get_word_driver_progress,
+    get_users_with_unindexed_entries,
+    get_user_entries_after,
+    add_word_drivers,
+    reset_word_drivers,
+)
+from utils.explanation_cache import explain_cached
+from utils.tokenizer_utils import word_attributions
+
+# Index updates for new entries run here, one at a time, off the page's thread
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="word-drivers")
+# Share of wall time in-app index updates may spend explaining, so they don't starve page requests
+WORD_DRIVER_CPU_BUDGET = float(os.getenv("WORD_DRIVER_CPU_BUDGET", 0.25))
+
+
+def default_engine():
+    """Fast gradient attribution when the loaded model supports it, budgeted SHAP otherwise."""
+    classifier = get_model()
+    return "fast" if classifier.model is not None and classifier.precision != "int8" else "shap"
+
+
+def entry_word_impacts(text, engine):
+    """(words, impacts) for one entry: lowercased words and their summed attribution per EMOTION_LABELS column."""
+    encoding = get_model().tokenizer(text, return_offsets_mapping=True)
+    attribution = explain_cached(text, EMOTION_LABELS, encoding=encoding, mode="budget", engine=engine)
+    words, values = word_attributions(encoding, text, attribution.values)
+
+    words = np.array([word.lower() for word in words], dtype=object)
+    keep = np.array([word.isalpha() and len(word) > 2 for word in words], dtype=bool)
+    if not keep.any():
+        return [], np.zeros((0, len(EMOTION_LABELS)), dtype=np.float32)
+    unique, inverse = np.unique(words[keep], return_inverse=True)
+    impacts = np.zeros((len(unique), values.shape[1]), dtype=np.float32)
+    np.add.at(impacts, inverse, values[keep])
+    return list(unique), impacts
+
+
+def index_user(user, batch_size=32, engine=None, rebuild=False, cpu_budget=1.0, log=print):
+    """
+    Explain a user's not-yet-indexed entries and add them to the word driver index.
+    Sleeps after each batch so busy time stays at cpu_budget (0-1] of wall time.
+    Returns the number of entries indexed.
+    """
+    if not 0 < cpu_budget <= 1:
+        raise ValueError("cpu_budget must be in (0, 1]")
+    engine = engine or default_engine()
+
+    conn = get_job_connection()
+    if rebuild:
+        reset_word_drivers(conn, user)
+    last_id, entries_done = get_word_driver_progress(conn, user)
+
+    indexed = 0
+    try:
+        while True:
+            rows = get_user_entries_after(conn, user, last_id, batch_size)
+            if not rows:
+                break
+
+            busy_started = time.monotonic()
+            totals = {}
+            for _, text in rows:
+                if not (text or "").strip():
+                    continue
+                words, impacts = entry_word_impacts(text, engine)
+                for word, row in zip(words, impacts):
+                    for emotion, impact in zip(EMOTION_LABELS, row):
+                        total, entries = totals.get((word, emotion), (0.0, 0))
+                        totals[(word, emotion)] = (total + float(impact), entries + 1)
+
+            increments = [(word, emotion, impact, entries) for (word, emotion), (impact, entries) in totals.items()]
+            if not add_word_drivers(conn, user, increments, last_id, rows[-1][0], entries_done + len(rows)):
+                log(f"Index for {user} was advanced by another job; stopping")
+                break
+            last_id = rows[-1][0]
+            entries_done += len(rows)
+            indexed += len(rows)
+
+            busy = time.monotonic() - busy_started
+            log(f"{user}: {entries_done} entries indexed (last id {last_id}, {len(rows) / busy:.1f} entries/s)")
+            time.sleep(busy * (1 - cpu_budget) / cpu_budget)
+    finally:
+        conn.close()
+    return indexed
+
+
+def index_all(batch_size=32, engine=None, cpu_budget=1.0, log=print):
+    """Run index_user for every user with entries newer than their index. Returns entries indexed."""
+    conn = get_job_connection()
+    users = get_users_with_unindexed_entries(conn)
+    conn.close()
+    return sum(index_user(user, batch_size, engine, cpu_budget=cpu_budget, log=log) for user in users)
+
+
+def submit_index_update(user, cpu_budget=WORD_DRIVER_CPU_BUDGET):
+    """
+    Index a user's new entries in the background (e.g. right after saving one); returns a Future.
+    Runs at cpu_budget inside the app process; SHAP goes to the explanation pool when
+    EXPLANATION_PROCESSES > 0. Large backfills are better left to the CLI or a --follow job.
+    """
+    return _executor.submit(index_user, user, cpu_budget=cpu_budget, log=lambda message: None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the per-user word driver index from journal entries.")
+    parser.add_argument("--user", default=None, help="Only index this user (default: every user with new entries)")
+    parser.add_argument("--batch-size", type=int, default=32, help="Entries explained per committed batch")
+    parser.add_argument("--engine", choices=["fast", "shap"], default=None,
+                        help="Attribution engine (default: fast when the model supports gradients)")
+    parser.add_argument("--rebuild", action="store_true", help="Drop the user's index and rebuild it (needs --user)")
+    parser.add_argument("--cpu-budget", type=float, default=1.0, help="Fraction of wall time spent computing (0-1]")
+    parser.add_argument("--follow", action="store_true", help="Keep polling for new entries")
+    parser.add_argument("--poll-seconds", type=int, default=60)
+    args = parser.parse_args()
+    if args.rebuild and not args.user:
+        parser.error("--rebuild needs --user")
+
+    init_db()
+    started = time.monotonic()
+    indexed = 0
+    while True:
+        if args.user:
+            indexed += index_user(args.user, args.batch_size, args.engine, args.rebuild, args.cpu_budget)
+            args.rebuild = False
+        else:
+            indexed += index_all(args.batch_size, args.engine, args.cpu_budget)
+        if not args.follow:
+            break
+        time.sleep(args.poll_seconds)
+    print(f"✅ Indexed {indexed} entries in {time.monotonic() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()